@@ -0,0 +1,205 @@
+"""
+In-memory stand-ins for the gspread Spreadsheet and Worksheet classes.
+
+They implement the calls run.py makes against Google Sheets, count every
+request, and can add simulated latency or answer with quota (429) and
+server (5xx) errors, so the app can be exercised without credentials:
+
+    import run
+    from fake_gspread import FakeSpreadsheet
+    run.SHEET = FakeSpreadsheet({'Input data': rows, ...}, error_rate=0.2)
+"""
+from collections import Counter
+import random
+import re
+import threading
+import time
+
+from gspread.exceptions import APIError, WorksheetNotFound
+
+import run
+
+GENDERS = list(run.GENDER_CHOICES.values())
+AGE_GROUPS = list(run.AGE_GROUP_CHOICES.values())
+INCOME_BRACKETS = list(run.INCOME_BRACKET_CHOICES.values())
+HEADER = list(run.INPUT_DATA_HEADER)
+
+
+def generate_respondents(count, seed=0):
+    """
+    Yields `count` respondent rows drawn from the real choices.
+    The same seed always gives the same rows.
+    """
+    generator = random.Random(seed)
+    for _ in range(count):
+        yield [
+            generator.choice(GENDERS),
+            generator.choice(AGE_GROUPS),
+            generator.choice(INCOME_BRACKETS),
+            generator.randint(0, 10)
+        ]
+
+
+def survey_spreadsheet(respondents=0, seed=0, **options):
+    """
+    Returns a FakeSpreadsheet laid out like 'ProductSurvey'.
+    """
+    return FakeSpreadsheet({
+        'Input data': [HEADER] + list(generate_respondents(respondents, seed)),
+        'Stored last search': [HEADER]
+    }, **options)
+
+
+class FakeResponse:
+    """
+    Just enough of a requests.Response for gspread's APIError.
+    """
+
+    def __init__(self, status_code, message):
+        self.status_code = status_code
+        self.text = message
+
+    def json(self):
+        return {'error': {'code': self.status_code, 'message': self.text}}
+
+
+def parse_range(cell_range):
+    """
+    Returns the first and last row (or None) of an A1 range such as
+    'A1:D1' or 'A5:D'.
+    """
+    match = re.fullmatch(r"[A-Z]+(\d+):[A-Z]+(\d*)", cell_range)
+    first_row = int(match.group(1))
+    last_row = int(match.group(2)) if match.group(2) else None
+    return first_row, last_row
+
+
+class FakeWorksheet:
+    """
+    A worksheet held as a list of rows of strings, header first.
+    """
+
+    def __init__(self, spreadsheet, title, values):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.values = [[str(value) for value in row] for row in values]
+
+    def get_all_values(self, **kwargs):
+        self.spreadsheet.request('read', 'get_all_values')
+        return [list(row) for row in self.values]
+
+    def get_all_records(self, **kwargs):
+        self.spreadsheet.request('read', 'get_all_records')
+        header = self.values[0] if self.values else []
+        records = []
+        for row in self.values[1:]:
+            record = dict(zip(header, row))
+            for key, value in record.items():
+                if value.isdigit():
+                    record[key] = int(value)
+            records.append(record)
+        return records
+
+    def get(self, cell_range, **kwargs):
+        self.spreadsheet.request('read', 'get')
+        return self.read_range(cell_range)
+
+    def batch_get(self, ranges, **kwargs):
+        self.spreadsheet.request('read', 'batch_get')
+        return [self.read_range(cell_range) for cell_range in ranges]
+
+    def read_range(self, cell_range):
+        first_row, last_row = parse_range(cell_range)
+        rows = self.values[first_row - 1:last_row]
+        self.spreadsheet.rows_read += len(rows)
+        return [list(row) for row in rows]
+
+    def row_values(self, row, **kwargs):
+        self.spreadsheet.request('read', 'row_values')
+        if row > len(self.values):
+            return []
+        return list(self.values[row - 1])
+
+    def col_values(self, col, **kwargs):
+        self.spreadsheet.request('read', 'col_values')
+        self.spreadsheet.rows_read += len(self.values)
+        values = [row[col - 1] if col <= len(row) else ''
+                  for row in self.values]
+        while values and not values[-1]:
+            values.pop()
+        return values
+
+    def append_row(self, values, **kwargs):
+        self.spreadsheet.request('write', 'append_row')
+        self.values.append([str(value) for value in values])
+        return self.append_response(1)
+
+    def append_rows(self, values, **kwargs):
+        self.spreadsheet.request('write', 'append_rows')
+        self.values.extend([str(value) for value in row] for row in values)
+        return self.append_response(len(values))
+
+    def append_response(self, count):
+        # The part of the Sheets API response the app reads
+        first_row = len(self.values) - count + 1
+        return {'updates': {
+            'updatedRange': f"'{self.title}'!A{first_row}:"
+                            f"Z{len(self.values)}"
+        }}
+
+    @property
+    def row_count(self):
+        return len(self.values)
+
+
+class FakeSpreadsheet:
+    """
+    A spreadsheet of FakeWorksheets. Every request waits `latency`
+    seconds and fails with a 429 error with probability `error_rate`.
+    fail_next() makes the next requests fail with a given status.
+    """
+
+    def __init__(self, worksheets, latency=0, error_rate=0, seed=0):
+        self.worksheets = {
+            title: FakeWorksheet(self, title, values)
+            for title, values in worksheets.items()
+        }
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = Counter()
+        self.errors = Counter()
+        self.failures = []
+        self.rows_read = 0
+
+    def fail_next(self, count, status=429):
+        with self.lock:
+            self.failures.extend([status] * count)
+
+    def request(self, kind, name):
+        """
+        Records one API request, then sleeps and fails as configured.
+        """
+        with self.lock:
+            self.calls[name] += 1
+            if self.failures:
+                status = self.failures.pop(0)
+            elif self.random.random() < self.error_rate:
+                status = 429
+            else:
+                status = None
+            if status is not None:
+                self.errors[status] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if status is not None:
+            raise APIError(FakeResponse(
+                status, f"Simulated {kind} error {status} in {name}"
+            ))
+
+    def worksheet(self, title):
+        self.request('read', 'worksheet')
+        if title not in self.worksheets:
+            raise WorksheetNotFound(title)
+        return self.worksheets[title]
@@ -0,0 +1,137 @@
+"""
+Drives the terminal menus of run.py through a long scripted session.
+
+A fixed loop of menu choices (segment searches, the stored persona
+views, invalid choices and their "try again" prompts) is answered until
+the requested number of screens has been shown, then the session exits
+from the main menu. The stack depth is sampled at every screen and the
+traced memory every 1,000 screens, and both must stay flat for the
+whole session. The results are printed as JSON, and the script exits
+with status 1 if the stack depth changed or the memory grew by more
+than --memory-growth-kb after the first sample.
+
+Usage: python benchmarks/long_session.py [--navigations 100000]
+                                         [--memory-growth-kb 256]
+"""
+import argparse
+import builtins
+import contextlib
+import itertools
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__
+))))
+
+import run  # noqa: E402
+from fake_gspread import survey_spreadsheet  # noqa: E402
+
+# One lap of answers, starting and ending at the main menu
+SCRIPT = [
+    '2', '1', 'M', '',        # search by gender
+    '2', '3', '',             # search by income bracket
+    '9',                      # back to the main menu
+    '3', '1', '',             # last stored persona
+    '3',                      # back to the main menu
+    'x', '',                  # invalid main menu choice
+    '2', '0', '', '9',        # invalid extract menu choice
+]
+
+
+def stack_depth():
+    """
+    Returns the number of frames on the current stack.
+    """
+    frame = sys._getframe()
+    depth = 0
+    while frame is not None:
+        depth += 1
+        frame = frame.f_back
+    return depth
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--navigations', type=int, default=100000)
+    parser.add_argument('--respondents', type=int, default=1000)
+    parser.add_argument('--memory-growth-kb', type=int, default=256)
+    args = parser.parse_args()
+
+    run.SHEET = survey_spreadsheet(args.respondents)
+    # The fake has no quota, and the session should not wait on one
+    run.SCHEDULER = run.SheetsScheduler(
+        reads_per_minute=10 ** 9, writes_per_minute=10 ** 9
+    )
+    run.BACKEND = run.GoogleSheetsBackend()
+    run.SNAPSHOT = run.SurveySnapshot(path='')
+    run.SURVEY_OUTBOX = ''
+    run.get_backend().append_stored_persona(
+        ['Female', '25-34', 'High', '70.0%']
+    )
+
+    navigations = 0
+    depths = set()
+    memory = []
+    current = ['main']
+
+    def screen(name, show):
+        def counted():
+            nonlocal navigations
+            navigations += 1
+            current[0] = name
+            depths.add(stack_depth())
+            if navigations % 1000 == 0:
+                memory.append(tracemalloc.get_traced_memory()[0])
+            return show()
+        return counted
+
+    run.MENU_SCREENS = {
+        name: screen(name, show) for name, show in run.MENU_SCREENS.items()
+    }
+    answers = itertools.cycle(SCRIPT)
+
+    def answer(prompt=''):
+        if navigations >= args.navigations and current[0] == 'main':
+            return '4'
+        return next(answers)
+
+    builtins.input = answer
+    tracemalloc.start()
+    started_at = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, \
+            contextlib.redirect_stdout(devnull):
+        run.main()
+    elapsed = time.perf_counter() - started_at
+    if not memory:
+        memory.append(tracemalloc.get_traced_memory()[0])
+
+    print(json.dumps({
+        'navigations': navigations,
+        'seconds': round(elapsed, 2),
+        'stack_depth_min': min(depths),
+        'stack_depth_max': max(depths),
+        'traced_memory_first_kb': round(memory[0] / 1024),
+        'traced_memory_last_kb': round(memory[-1] / 1024),
+        'traced_memory_max_kb': round(max(memory) / 1024)
+    }, indent=2))
+
+    failures = []
+    if len(depths) > 1:
+        failures.append(f"the stack depth went from {min(depths)} to "
+                        f"{max(depths)} frames")
+    growth_kb = (max(memory) - memory[0]) / 1024
+    if growth_kb > args.memory_growth_kb:
+        failures.append(f"the traced memory grew by {growth_kb:.0f} KB, "
+                        f"more than {args.memory_growth_kb} KB")
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Drives run.py's Sheets request scheduler against a fake spreadsheet that
+answers a share of requests with quota errors.
+
+Sixteen sessions ask for the stored personas at the same moment, to show
+identical reads being coalesced. Then the survey data is loaded and a
+batch of responses is inserted while quota errors are injected. Every
+call must still succeed. The scheduler metrics and the requests the
+fake saw are printed as JSON.
+
+Usage: python benchmarks/quota.py [--error-rate 0.3] [--inserts 50]
+"""
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__
+))))
+
+import run  # noqa: E402
+from fake_gspread import generate_respondents  # noqa: E402
+from fake_gspread import survey_spreadsheet  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--respondents', type=int, default=1000)
+    parser.add_argument('--error-rate', type=float, default=0.3)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--inserts', type=int, default=50)
+    parser.add_argument('--sessions', type=int, default=16)
+    parser.add_argument('--quota', type=int, default=6000,
+                        help="read and write requests allowed per minute")
+    args = parser.parse_args()
+
+    spreadsheet = survey_spreadsheet(
+        args.respondents, latency=args.latency, error_rate=args.error_rate
+    )
+    run.SHEET = spreadsheet
+    run.SCHEDULER = run.SheetsScheduler(
+        reads_per_minute=args.quota, writes_per_minute=args.quota,
+        backoff_base=0.01, backoff_cap=0.1, max_retries=10
+    )
+    run.BACKEND = run.GoogleSheetsBackend()
+    run.SNAPSHOT = run.SurveySnapshot(path='')
+
+    with ThreadPoolExecutor(args.sessions) as executor:
+        list(executor.map(
+            lambda _: run.get_backend().read_stored_personas(),
+            range(args.sessions)
+        ))
+
+    run.SNAPSHOT.get_cube()
+    for row in generate_respondents(args.inserts, seed=1):
+        run.save_response(dict(zip(run.INPUT_DATA_HEADER, row)))
+    run.close_outbox()
+
+    loaded = len(spreadsheet.worksheets['Input data'].values) - 1
+    print(json.dumps({
+        'respondents': loaded,
+        'expected': args.respondents + args.inserts,
+        'scheduler': run.SCHEDULER.metrics(),
+        'api_calls': dict(spreadsheet.calls),
+        'api_errors': dict(spreadsheet.errors)
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Measures how long `python run.py` takes to show its first menu.
+
+The "lazy" run is the app as it ships: the welcome menu is printed
+before gspread is imported or the spreadsheet is opened. The "eager"
+run connects to the 'ProductSurvey' spreadsheet before showing the
+menu, which is how run.py used to start up, and needs creds.json.
+The "gspread import" run times the library imports on their own,
+which is the part of the old startup that needs no network.
+
+Usage: python benchmarks/startup.py [--runs N] [--json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MENU_PROMPT = b"Enter your choice"
+
+COMMANDS = {
+    'lazy': [sys.executable, 'run.py'],
+    'eager': [
+        sys.executable, '-c',
+        'import run; run.get_sheet(); run.main()'
+    ],
+    'gspread import': [
+        sys.executable, '-c',
+        'import gspread; '
+        'from google.oauth2.service_account import Credentials'
+    ]
+}
+
+
+def time_to_first_menu(command):
+    """
+    Starts the command and returns the seconds until the menu
+    prompt is written, or None if the process exits first.
+    """
+    env = dict(os.environ, PYTHONUNBUFFERED='1', TERM='dumb')
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        command, cwd=ROOT, env=env, stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+    )
+    output = b''
+    while MENU_PROMPT not in output:
+        chunk = process.stdout.read1(4096)
+        if not chunk:
+            process.wait()
+            return None
+        output += chunk
+    elapsed = time.perf_counter() - start
+    process.communicate(b'4\n', timeout=10)
+    return elapsed
+
+
+def time_to_exit(command):
+    """
+    Returns the seconds the command takes to run to completion.
+    """
+    start = time.perf_counter()
+    completed = subprocess.run(
+        command, cwd=ROOT, stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    if completed.returncode != 0:
+        return None
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--json', action='store_true',
+                        help='print the results as one JSON object')
+    args = parser.parse_args()
+
+    results = {}
+    for name, command in COMMANDS.items():
+        if name == 'gspread import':
+            measure = time_to_exit
+        else:
+            measure = time_to_first_menu
+        timings = [measure(command) for _ in range(args.runs)]
+        if None in timings:
+            results[name] = None
+            continue
+        results[name] = {
+            'median_ms': round(statistics.median(timings) * 1000, 1),
+            'min_ms': round(min(timings) * 1000, 1),
+            'runs': args.runs
+        }
+
+    if args.json:
+        print(json.dumps(results))
+        return
+
+    print("Time to first menu (gspread import: time to import only):")
+    for name, result in results.items():
+        if result is None:
+            print(f"  {name:<14} unavailable (check creds.json)")
+        else:
+            print(f"  {name:<14} median {result['median_ms']:>8.1f} ms   "
+                  f"min {result['min_ms']:>8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
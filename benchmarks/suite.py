@@ -0,0 +1,244 @@
+"""
+Times run.py's read and write paths as 'Input data' grows.
+
+For every survey size a fake 'ProductSurvey' spreadsheet is filled with
+the same synthetic respondents (one stored persona per hundred of them),
+and each case below is run against it: the cold load, every
+calculate_likelihood_* function on the warm data, the full report with
+bootstrap confidence intervals, the insert_data and store_search_result
+write paths through the outbox, the sync that follows an insert, and
+the two stored persona views. Each case reports
+its latency, the API requests and rows it read per run, and the peak
+memory of one traced run. Every request to the fake can be given a
+simulated latency to stand in for the network.
+
+The results are printed as JSON, and saved with --output so runs can
+be compared over time.
+
+Usage: python benchmarks/suite.py [--sizes 1000,100000,1000000]
+                                  [--latency 0.05] [--repeat 20]
+                                  [--output results.json]
+"""
+from collections import Counter
+import argparse
+import builtins
+import contextlib
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__
+))))
+
+import run  # noqa: E402
+from fake_gspread import generate_respondents  # noqa: E402
+from fake_gspread import survey_spreadsheet  # noqa: E402
+
+PERSONA = {
+    'Gender': 'Female',
+    'Age Group': '25-34',
+    'Income Bracket': '$50,000-$74,999'
+}
+RESPONSE = dict(PERSONA, Likelihood=7)
+
+
+def measure(spreadsheet, action, repeat):
+    """
+    Runs the action repeat times and returns its latency, the API
+    requests and rows read per run, and the peak memory of one more
+    run made with tracemalloc on, which would skew the timings.
+    """
+    calls = Counter(spreadsheet.calls)
+    rows_read = spreadsheet.rows_read
+    timings = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        action()
+        timings.append(time.perf_counter() - started_at)
+    calls = spreadsheet.calls - calls
+    rows_read = spreadsheet.rows_read - rows_read
+
+    tracemalloc.start()
+    action()
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        'runs': repeat,
+        'latency_mean_ms': round(statistics.mean(timings) * 1000, 3),
+        'latency_median_ms': round(statistics.median(timings) * 1000, 3),
+        'latency_max_ms': round(max(timings) * 1000, 3),
+        'api_calls': {
+            name: count / repeat for name, count in sorted(calls.items())
+        },
+        'rows_read': rows_read / repeat,
+        'peak_memory_kb': round(peak_memory / 1024)
+    }
+
+
+def cold_load():
+    """
+    Loads and aggregates 'Input data' into an empty snapshot.
+    """
+    run.SNAPSHOT = run.SurveySnapshot(path='')
+    run.SNAPSHOT.get_cube()
+
+
+def insert_response():
+    """
+    insert_data's write path: the response is queued in the outbox
+    and counted as done once the outbox has written it.
+    """
+    run.save_response(RESPONSE)
+    run.OUTBOX.flush()
+
+
+def store_persona():
+    """
+    Stores a persona and waits for the outbox to write it.
+    """
+    run.store_search_result(PERSONA, 55.0)
+    run.OUTBOX.flush()
+
+
+def sync_after_insert():
+    """
+    The sync insert_data starts after a response from another
+    session has been appended to the sheet.
+    """
+    worksheet = run.get_worksheet('Input data')
+    worksheet.values.append([str(value) for value in RESPONSE.values()])
+    run.SNAPSHOT.sync()
+
+
+def answering(answers, view):
+    """
+    Returns an action that runs a view with its output discarded,
+    answering its prompts in turn.
+    """
+    def action():
+        replies = iter(answers)
+        builtins.input = lambda prompt='': next(replies)
+        with open(os.devnull, 'w') as devnull, \
+                contextlib.redirect_stdout(devnull):
+            view()
+    return action
+
+
+CASES = {
+    'calculate_likelihood_gender': lambda: (
+        run.calculate_likelihood_gender('Female')
+    ),
+    'calculate_likelihood_age_group': lambda: (
+        run.calculate_likelihood_age_group('25-34')
+    ),
+    'calculate_likelihood_income_bracket': lambda: (
+        run.calculate_likelihood_income_bracket('$50,000-$74,999')
+    ),
+    'calculate_likelihood_gender_and_age_group': lambda: (
+        run.calculate_likelihood_gender_and_age_group('Female', '25-34')
+    ),
+    'calculate_likelihood_gender_and_income_bracket': lambda: (
+        run.calculate_likelihood_gender_and_income_bracket(
+            'Female', '$50,000-$74,999'
+        )
+    ),
+    'calculate_likelihood_age_group_and_income_bracket': lambda: (
+        run.calculate_likelihood_age_group_and_income_bracket(
+            '25-34', '$50,000-$74,999'
+        )
+    ),
+    'calculate_likelihood_persona': lambda: (
+        run.calculate_likelihood_persona(PERSONA)
+    ),
+    'build_full_report with intervals': lambda: (
+        run.build_full_report(run.SNAPSHOT.get_cube(), intervals=True)
+    ),
+    'insert_data write path': insert_response,
+    'sync after insert': sync_after_insert,
+    'store_search_result': store_persona,
+    'view_last_search_persona': answering(
+        [''], run.view_last_search_persona
+    ),
+    'view_all_stored_search_personas (3 pages)': answering(
+        ['n', 'n', ''], run.view_all_stored_search_personas
+    )
+}
+
+
+def benchmark_size(respondents, latency, repeat):
+    """
+    Runs every case against a fake spreadsheet with the given
+    number of respondents and returns one result per case.
+    """
+    spreadsheet = survey_spreadsheet(respondents, latency=latency)
+    spreadsheet.worksheets['Stored last search'].values.extend(
+        [str(value) for value in row[:3]] + [f"{row[3] * 10:.1f}%"]
+        for row in generate_respondents(respondents // 100, seed=1)
+    )
+    run.SHEET = spreadsheet
+    run.WORKSHEETS.clear()
+    run.BACKEND = run.GoogleSheetsBackend()
+
+    results = [dict(
+        case='cold load', rows=respondents,
+        **measure(spreadsheet, cold_load, 1)
+    )]
+    for name, action in CASES.items():
+        results.append(dict(
+            case=name, rows=respondents,
+            **measure(spreadsheet, action, repeat)
+        ))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', default='1000,100000,1000000',
+                        help="comma separated numbers of respondents")
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help="simulated seconds per API request")
+    parser.add_argument('--repeat', type=int, default=20,
+                        help="runs of each case after the cold load")
+    parser.add_argument('--output', help="also save the results here")
+    args = parser.parse_args()
+
+    # The fake has no quota, and the timings should not include one
+    run.SCHEDULER = run.SheetsScheduler(
+        reads_per_minute=10 ** 9, writes_per_minute=10 ** 9
+    )
+    outbox_directory = tempfile.mkdtemp(prefix='survey-outbox-')
+    run.SURVEY_OUTBOX = outbox_directory
+    input_function = builtins.input
+    started_at = time.strftime('%Y-%m-%dT%H:%M:%S')
+    results = []
+    try:
+        for size in args.sizes.split(','):
+            results.extend(benchmark_size(int(size), args.latency,
+                                          args.repeat))
+    finally:
+        builtins.input = input_function
+        run.close_outbox()
+        shutil.rmtree(outbox_directory)
+
+    report = json.dumps({
+        'started_at': started_at,
+        'python': platform.python_version(),
+        'latency': args.latency,
+        'results': results
+    }, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
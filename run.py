@@ -1,7 +1,34 @@
-import gspread
-from google.oauth2.service_account import Credentials
-import statistics
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from concurrent.futures import Future
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import atexit
+import contextlib
+import csv
+import functools
+import glob
+import hashlib
+import io
+import itertools
+import json
+import math
 import os
+import random
+import signal
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no fcntl, so journals of crashed sessions are not adopted
+    fcntl = None
 
 
 class Color:
@@ -22,11 +49,2192 @@ SCOPE = [
     "https://www.googleapis.com/auth/drive.file",
     "https://www.googleapis.com/auth/drive"
 ]
-# Code from the Love Sandwiches Walkthrough Project: https://github.com/Code-Institute-Solutions/love-sandwiches-p5-sourcecode/tree/master/01-getting-set-up/02-connecting-oto-our-api-with-python
-CREDS = Credentials.from_service_account_file('creds.json')
-SCOPED_CREDS = CREDS.with_scopes(SCOPE)
-GSPREAD_CLIENT = gspread.authorize(SCOPED_CREDS)
-SHEET = GSPREAD_CLIENT.open('ProductSurvey')
+GSPREAD_CLIENT = None
+SHEET = None
+WORKSHEETS = {}
+
+# Set SURVEY_PROFILE to time and count every Sheets request and data
+# step of a session, and SURVEY_TRACE to a file to log each one to
+SURVEY_PROFILE = os.environ.get('SURVEY_PROFILE', '')
+SURVEY_TRACE = os.environ.get('SURVEY_TRACE', '')
+# Upper bounds of the latency histogram buckets, in milliseconds
+PROFILE_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+
+class Profiler:
+    """
+    The Profiler class collects the timings of a session: how often
+    each Sheets request, aggregation and calculate_* step ran, how
+    long it took, as a total, a maximum and a latency histogram, how
+    many rows and bytes it moved and how often it failed. Each
+    timing can also be appended to a JSON lines trace file, which is
+    line buffered so a killed session loses none of it. close()
+    prints the summary and adds it to the trace.
+    """
+
+    def __init__(self, trace_path=None):
+        self.lock = threading.Lock()
+        self.started_at = time.monotonic()
+        self.stats = {}
+        self.trace = (open(trace_path, 'a', buffering=1) if trace_path
+                      else None)
+
+    def record(self, category, name, seconds, rows=None, size=None,
+               error=None):
+        """
+        Adds one timed call to the totals and the trace.
+        """
+        milliseconds = seconds * 1000
+        with self.lock:
+            stat = self.stats.get((category, name))
+            if stat is None:
+                stat = self.stats[(category, name)] = {
+                    'calls': 0, 'errors': 0, 'total_ms': 0.0,
+                    'max_ms': 0.0, 'rows': 0, 'bytes': 0,
+                    'histogram': [0] * (len(PROFILE_BUCKETS_MS) + 1)
+                }
+            stat['calls'] += 1
+            stat['errors'] += error is not None
+            stat['total_ms'] += milliseconds
+            stat['max_ms'] = max(stat['max_ms'], milliseconds)
+            stat['rows'] += rows or 0
+            stat['bytes'] += size or 0
+            stat['histogram'][
+                bisect_left(PROFILE_BUCKETS_MS, milliseconds)
+            ] += 1
+            if self.trace is not None:
+                self.trace.write(json.dumps({
+                    'at': round(time.time(), 6),
+                    'thread': threading.current_thread().name,
+                    'category': category, 'name': name,
+                    'ms': round(milliseconds, 3), 'rows': rows,
+                    'bytes': size, 'error': error
+                }) + "\n")
+
+    def summary(self):
+        """
+        Returns the totals of every timed step, slowest first.
+        """
+        labels = [f"<={bound}ms" for bound in PROFILE_BUCKETS_MS]
+        labels.append(f">{PROFILE_BUCKETS_MS[-1]}ms")
+        with self.lock:
+            stats = [
+                dict(stat, category=category, name=name,
+                     mean_ms=stat['total_ms'] / stat['calls'],
+                     histogram={
+                         label: count for label, count in
+                         zip(labels, stat['histogram']) if count
+                     })
+                for (category, name), stat in self.stats.items()
+            ]
+        return sorted(stats, key=lambda stat: -stat['total_ms'])
+
+    def print_summary(self, stream):
+        """
+        Prints the summary as a table.
+        """
+        stream.write(f"\nProfile of this session "
+                     f"({time.monotonic() - self.started_at:.1f} s):\n")
+        stream.write(f"{'step':<44}{'calls':>7}{'errors':>7}"
+                     f"{'total ms':>11}{'mean ms':>10}{'max ms':>10}"
+                     f"{'rows':>9}{'bytes':>11}\n")
+        for stat in self.summary():
+            step = f"{stat['category']}: {stat['name']}"
+            stream.write(f"{step[:43]:<44}{stat['calls']:>7}"
+                         f"{stat['errors']:>7}{stat['total_ms']:>11.1f}"
+                         f"{stat['mean_ms']:>10.2f}{stat['max_ms']:>10.1f}"
+                         f"{stat['rows']:>9}{stat['bytes']:>11}\n")
+
+    def summary_line(self):
+        """
+        Returns the summary as a line of the trace.
+        """
+        return json.dumps({
+            'summary': self.summary(),
+            'session_seconds': round(time.monotonic() - self.started_at, 3)
+        }) + "\n"
+
+    def write_summary(self):
+        """
+        Adds the summary so far to the trace, so a session that is
+        never closed still leaves one behind.
+        """
+        line = self.summary_line()
+        with self.lock:
+            if self.trace is not None:
+                self.trace.write(line)
+
+    def close(self):
+        """
+        Prints the summary to stderr and ends the trace with it.
+        """
+        self.print_summary(sys.stderr)
+        line = self.summary_line()
+        with self.lock:
+            if self.trace is None:
+                return
+            trace, self.trace = self.trace, None
+        trace.write(line)
+        trace.close()
+
+
+PROFILER = None
+
+
+def exit_on_signal(signum, frame):
+    """
+    Exits through SystemExit when the process is terminated or its
+    terminal hangs up, so the atexit handlers still run.
+    """
+    sys.exit(128 + signum)
+
+
+def enable_profiling(trace_path=None):
+    """
+    Starts profiling this session. The summary is printed when
+    the process exits, including when it is sent SIGTERM or SIGHUP,
+    as a browser terminal does when its tab is closed.
+    """
+    global PROFILER
+    if PROFILER is None:
+        PROFILER = Profiler(trace_path)
+        atexit.register(PROFILER.close)
+        if threading.current_thread() is threading.main_thread():
+            for name in ('SIGTERM', 'SIGHUP'):
+                signum = getattr(signal, name, None)
+                if signum is not None and \
+                        signal.getsignal(signum) == signal.SIG_DFL:
+                    signal.signal(signum, exit_on_signal)
+    return PROFILER
+
+
+def measure_rows(data, kind):
+    """
+    Returns the number of rows and the JSON size in bytes of what a
+    Sheets request read or wrote, or (None, None) for other results.
+    """
+    if not isinstance(data, list):
+        return None, None
+    if data and isinstance(data[0], list) and data[0] and \
+            isinstance(data[0][0], list):
+        # batch_get: a list of ranges of rows
+        rows = sum(len(value_range) for value_range in data)
+    elif data and not isinstance(data[0], (list, dict)) and kind == 'write':
+        # append_row: the cells of one row
+        rows = 1
+    else:
+        rows = len(data)
+    return rows, len(json.dumps(data, default=str))
+
+
+@contextlib.contextmanager
+def profiled(category, name):
+    """
+    Times the with block when profiling is on. The block can put
+    the data it read or wrote under 'data' in the yielded dict, and
+    the 'kind' of request, to have its rows and bytes counted.
+    """
+    span = {}
+    if PROFILER is None:
+        yield span
+        return
+    error = None
+    started_at = time.perf_counter()
+    try:
+        yield span
+    except Exception as exception:
+        error = type(exception).__name__
+        raise
+    finally:
+        seconds = time.perf_counter() - started_at
+        rows, size = measure_rows(span.get('data'), span.get('kind'))
+        PROFILER.record(category, name, seconds, rows, size, error)
+
+
+def profile_calls(category):
+    """
+    Decorates a function so every call is timed when profiling is
+    on. When it is off the function is called directly.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if PROFILER is None:
+                return function(*args, **kwargs)
+            with profiled(category, function.__qualname__):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+if SURVEY_PROFILE or SURVEY_TRACE:
+    enable_profiling(SURVEY_TRACE or None)
+
+# Google Sheets allows 60 read and 60 write requests per minute per user
+SHEETS_READS_PER_MINUTE = 60
+SHEETS_WRITES_PER_MINUTE = 60
+SHEETS_BURST = 10
+SHEETS_MAX_RETRIES = 5
+SHEETS_BACKOFF_BASE = 1
+SHEETS_BACKOFF_CAP = 32
+
+
+class TokenBucket:
+    """
+    The TokenBucket class lets through `rate` calls per minute,
+    with bursts of up to `capacity` calls. acquire() blocks until
+    a token is free and returns the seconds it had to wait.
+    """
+
+    def __init__(self, rate, capacity, clock=time.monotonic,
+                 sleep=time.sleep):
+        self.rate = rate / 60
+        self.capacity = capacity
+        self.tokens = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        waited = 0
+        with self.lock:
+            while True:
+                now = self.clock()
+                self.tokens = min(
+                    self.capacity,
+                    self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+                self.sleep(delay)
+                waited += delay
+
+
+def is_rejected(error):
+    """
+    Returns True if the backend refused a write because of the rows
+    themselves: a Sheets API error in the 4xx range other than a
+    quota error, an invalid value, a broken constraint or an error
+    raised by the daemon. Sending the same rows again cannot work.
+    """
+    status = getattr(getattr(error, 'response', None), 'status_code', None)
+    if status is not None:
+        return 400 <= status < 500 and status != 429
+    if isinstance(error, DaemonError):
+        return not isinstance(error, DaemonUnavailable)
+    return isinstance(error, (ValueError, TypeError,
+                              sqlite3.IntegrityError))
+
+
+def is_retryable(error, kind='read'):
+    """
+    Returns True for quota (429) and server (5xx) errors from the
+    Sheets API, which are worth retrying after a pause. A write is
+    only retried after a quota error: a server error can come back
+    after the rows were appended, so retrying it here could write
+    them twice. The outbox retries those, leaving out the rows that
+    made it.
+    """
+    status = getattr(getattr(error, 'response', None), 'status_code', None)
+    if status is None:
+        return False
+    return status == 429 or (kind == 'read' and status >= 500)
+
+
+class SheetsScheduler:
+    """
+    The SheetsScheduler class runs every Google Sheets request.
+    Reads and writes each draw from their own token bucket so the
+    per-minute quotas are not exceeded. Quota and server errors
+    are retried with exponential backoff and full jitter, and
+    identical reads that are already in flight are coalesced so
+    concurrent callers share one fetch. metrics() reports how
+    long requests queued for a token and how often they retried.
+    """
+
+    def __init__(self, reads_per_minute=SHEETS_READS_PER_MINUTE,
+                 writes_per_minute=SHEETS_WRITES_PER_MINUTE,
+                 burst=SHEETS_BURST, max_retries=SHEETS_MAX_RETRIES,
+                 backoff_base=SHEETS_BACKOFF_BASE,
+                 backoff_cap=SHEETS_BACKOFF_CAP, sleep=time.sleep):
+        self.buckets = {
+            'read': TokenBucket(reads_per_minute, burst, sleep=sleep),
+            'write': TokenBucket(writes_per_minute, burst, sleep=sleep)
+        }
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.counters = {
+            'reads': 0, 'writes': 0, 'coalesced': 0, 'retries': 0,
+            'failures': 0, 'queue_delay_total': 0.0,
+            'queue_delay_max': 0.0, 'backoff_total': 0.0
+        }
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def call(self, kind, function, *args, **kwargs):
+        """
+        Runs one request once a token is free, retrying it with
+        backoff while the API answers with a quota error, or a
+        server error for reads.
+        """
+        self.count(kind + 's')
+        for attempt in range(self.max_retries + 1):
+            waited = self.buckets[kind].acquire()
+            with self.lock:
+                self.counters['queue_delay_total'] += waited
+                self.counters['queue_delay_max'] = max(
+                    self.counters['queue_delay_max'], waited
+                )
+            try:
+                with profiled('sheets', function.__name__) as span:
+                    result = function(*args, **kwargs)
+                    span['kind'] = kind
+                    span['data'] = (
+                        result if kind == 'read' else args[0] if args else None
+                    )
+                return result
+            except Exception as error:
+                if not is_retryable(error, kind) or \
+                        attempt == self.max_retries:
+                    self.count('failures')
+                    raise
+            delay = random.uniform(
+                0, min(self.backoff_cap, self.backoff_base * 2 ** attempt)
+            )
+            self.count('retries')
+            self.count('backoff_total', delay)
+            self.sleep(delay)
+
+    def read(self, key, function, *args, **kwargs):
+        """
+        Runs a read request, or waits for and shares the result of
+        an identical read (same key) that is already in flight.
+        """
+        with self.lock:
+            future = self.in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self.in_flight[key] = Future()
+            else:
+                self.counters['coalesced'] += 1
+        if not leader:
+            return future.result()
+
+        try:
+            result = self.call('read', function, *args, **kwargs)
+        except Exception as error:
+            future.set_exception(error)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+
+    def write(self, function, *args, **kwargs):
+        """
+        Runs a write request. Writes are never coalesced.
+        """
+        return self.call('write', function, *args, **kwargs)
+
+    def metrics(self):
+        """
+        Returns a copy of the counters, with the mean queueing delay.
+        """
+        with self.lock:
+            metrics = dict(self.counters)
+        requests = metrics['reads'] + metrics['writes']
+        metrics['queue_delay_mean'] = (
+            metrics['queue_delay_total'] / requests if requests else 0.0
+        )
+        return metrics
+
+
+SCHEDULER = SheetsScheduler()
+
+
+def get_gspread_client():
+    """
+    Returns the authorized gspread client, creating it on first
+    use. gspread and google-auth are imported here rather than at
+    the top of the file so the welcome menu can be shown before
+    the slow imports, authentication and network calls happen.
+    """
+    global GSPREAD_CLIENT
+    if GSPREAD_CLIENT is None:
+        with profiled('auth', 'import gspread'):
+            import gspread
+            from google.oauth2.service_account import Credentials
+
+        # Code from the Love Sandwiches Walkthrough Project: https://github.com/Code-Institute-Solutions/love-sandwiches-p5-sourcecode/tree/master/01-getting-set-up/02-connecting-oto-our-api-with-python
+        with profiled('auth', 'authorize'):
+            creds = Credentials.from_service_account_file('creds.json')
+            scoped_creds = creds.with_scopes(SCOPE)
+            GSPREAD_CLIENT = gspread.authorize(scoped_creds)
+    return GSPREAD_CLIENT
+
+
+def get_sheet():
+    """
+    Returns the 'ProductSurvey' spreadsheet, opening it on first use.
+    """
+    global SHEET
+    if SHEET is None:
+        SHEET = SCHEDULER.read(
+            ('open', 'ProductSurvey'), get_gspread_client().open,
+            'ProductSurvey'
+        )
+    return SHEET
+
+
+def last_column_letter(header):
+    """
+    Returns the letter of the last column a header fills, for
+    building A1 ranges such as 'A2:D'.
+    """
+    import gspread
+
+    return gspread.utils.rowcol_to_a1(1, len(header))[:-1]
+
+
+def appended_last_row(response):
+    """
+    Returns the number of the last sheet row an append request
+    wrote, from the range in its response, or None if it has none.
+    """
+    import gspread
+
+    try:
+        updated_range = response['updates']['updatedRange']
+    except (KeyError, TypeError):
+        return None
+    last_cell = updated_range.split('!')[-1].split(':')[-1]
+    return gspread.utils.a1_to_rowcol(last_cell)[0]
+
+
+def get_worksheet(title):
+    """
+    Returns a worksheet of 'ProductSurvey' from the registry, so
+    each worksheet is looked up only once per process. If the
+    lookup fails, the spreadsheet is reopened and the lookup is
+    tried once more, in case the worksheets have been changed.
+    """
+    global SHEET
+    if title not in WORKSHEETS:
+        import gspread
+
+        try:
+            WORKSHEETS[title] = SCHEDULER.read(
+                ('worksheet', title), get_sheet().worksheet, title
+            )
+        except gspread.exceptions.WorksheetNotFound:
+            SHEET = None
+            WORKSHEETS.clear()
+            WORKSHEETS[title] = SCHEDULER.read(
+                ('worksheet', title), get_sheet().worksheet, title
+            )
+    return WORKSHEETS[title]
+
+
+GENDER_CHOICES = {'M': 'Male', 'F': 'Female'}
+AGE_GROUP_CHOICES = {
+    '1': '18-24', '2': '25-34', '3': '35-44',
+    '4': '45-54', '5': '55-64', '6': '65+'
+}
+INCOME_BRACKET_CHOICES = {
+    '1': '$25,000-$49,999', '2': '$50,000-$74,999', '3': '$75,000-$99,999',
+    '4': '$100,000-$149,999', '5': '$150,000 or more'
+}
+
+# Likelihood is a whole number from 0 to 10, so 11 histogram bins.
+# 9-10 counts a promoter, 7-8 a passive and 0-6 a detractor.
+LIKELIHOOD_BINS = 11
+PROMOTER_LIKELIHOOD = 9
+PASSIVE_LIKELIHOOD = 7
+# Set SURVEY_INTERVALS, or pass --intervals, to show the number of
+# responses and a bootstrap confidence interval next to every segment
+# likelihood. Each interval is taken from BOOTSTRAP_RESAMPLES resamples,
+# spread over BOOTSTRAP_WORKERS processes (default: one per CPU).
+SURVEY_INTERVALS = os.environ.get('SURVEY_INTERVALS', '')
+SHOW_INTERVALS = bool(SURVEY_INTERVALS)
+BOOTSTRAP_RESAMPLES = 1000
+BOOTSTRAP_CONFIDENCE = 0.95
+BOOTSTRAP_WORKERS = None
+
+INPUT_DATA_HEADER = ['Gender', 'Age Group', 'Income Bracket', 'Likelihood']
+STORED_SEARCH_HEADER = [
+    'Gender', 'Age Group', 'Income Bracket', 'Likelihood'
+]
+
+# Storage backend: 'sheets' for Google Sheets, 'sqlite' for a local file
+SURVEY_BACKEND = os.environ.get('SURVEY_BACKEND', 'sheets')
+SURVEY_DB = os.environ.get('SURVEY_DB', 'survey.db')
+# Moves the cursor home and clears the screen and the scrollback, as
+# the 'clear' command does on the web terminal's xterm
+CLEAR_SCREEN = "\033[H\033[2J\033[3J"
+# Unix socket of a shared survey daemon (see server.py) for the terminal
+SURVEY_DAEMON = os.environ.get('SURVEY_DAEMON')
+# Directory of the write-behind journals; set it to '' to write directly
+SURVEY_OUTBOX = os.environ.get('SURVEY_OUTBOX', 'outbox')
+OUTBOX_BATCH_SIZE = 500
+OUTBOX_RETRY_DELAY = 5
+# Rows the backend refused are moved to this file in the outbox
+# directory, one JSON line each with the error, instead of retried
+OUTBOX_REJECTED = 'rejected.log'
+# File the parsed responses are kept in between runs; set it to '' to
+# download the whole sheet on every start
+SURVEY_SNAPSHOT = os.environ.get('SURVEY_SNAPSHOT', 'survey.snapshot')
+# Stored personas shown per page, and how long the views wait for
+# personas this session has just stored to leave the outbox
+STORED_PERSONAS_PAGE_SIZE = 10
+STORED_PERSONAS_FLUSH_TIMEOUT = 5
+# Rows per read request when downloading 'Input data', which bounds
+# the memory a download needs however long the sheet grows
+READ_PAGE_SIZE = 50000
+# Rows per append_rows request when importing a file of respondents;
+# small enough for one Sheets request, large enough that 50,000 rows
+# take ten writes
+IMPORT_CHUNK_SIZE = 5000
+
+
+# Rows written through the outbox carry their submission key in the
+# column after the data, so a retried batch can skip rows already written
+SUBMISSION_KEY_COLUMN = len(INPUT_DATA_HEADER) + 1
+
+
+class GoogleSheetsBackend:
+    """
+    The GoogleSheetsBackend class stores respondents in the
+    'Input data' worksheet and stored personas in the 'Stored
+    last search' worksheet of the 'ProductSurvey' spreadsheet.
+    """
+
+    WORKSHEETS = {
+        'respondents': 'Input data',
+        'stored_personas': 'Stored last search'
+    }
+    source = 'sheets:ProductSurvey'
+
+    def __init__(self):
+        # Stored personas as last counted or reported by an append,
+        # and when, so the views do not read a column to count them
+        self.stored_persona_count = None
+        self.stored_persona_counted_at = 0
+
+    def append_respondent(self, row):
+        """
+        Appends one respondent row to 'Input data'.
+        """
+        SCHEDULER.write(get_worksheet('Input data').append_row, row)
+
+    def read_respondents(self, first_row=2):
+        """
+        Returns the header and the respondent rows from the given
+        sheet row onwards (row 1 is the header).
+        """
+        header, rows = list(INPUT_DATA_HEADER), []
+        for header, page in self.read_respondent_pages(first_row):
+            rows.extend(page)
+        return header, rows
+
+    def read_respondent_pages(self, first_row=2, page_size=READ_PAGE_SIZE):
+        """
+        Yields (header, rows) for each page of up to page_size
+        respondent rows from the given sheet row onwards, each row
+        followed by its submission key if it has one. The header
+        comes with the first page in one batch_get request and each
+        later page is one more request, so only one page is held in
+        memory at a time however long the sheet is.
+        """
+        input_data_worksheet = get_worksheet('Input data')
+        last_column = last_column_letter(INPUT_DATA_HEADER)
+        key_column = last_column_letter([None] * SUBMISSION_KEY_COLUMN)
+        header = None
+        ranges = [f"A1:{last_column}1"]
+        while True:
+            last_row = first_row + page_size - 1
+            ranges.append(f"A{first_row}:{key_column}{last_row}")
+            value_ranges = SCHEDULER.read(
+                ('batch_get', 'Input data', tuple(ranges)),
+                input_data_worksheet.batch_get, ranges
+            )
+            page = value_ranges[-1]
+            if header is None:
+                header = (value_ranges[0][0] if value_ranges[0]
+                          else list(INPUT_DATA_HEADER))
+            yield header, list(page)
+            if len(page) < page_size:
+                return
+            first_row = last_row + 1
+            ranges = []
+
+    def append_stored_persona(self, row):
+        """
+        Appends one stored persona row to 'Stored last search'.
+        """
+        self.note_stored_personas(SCHEDULER.write(
+            get_worksheet('Stored last search').append_row, row
+        ))
+
+    def read_stored_personas(self, offset=0, limit=None):
+        """
+        Returns the stored personas as records, either all of them
+        or up to limit of them from the offset on. A page is read
+        with one ranged request, so it costs the same however many
+        personas are stored.
+        """
+        worksheet = get_worksheet('Stored last search')
+        if limit is None:
+            values = SCHEDULER.read(
+                ('get_all_values', 'Stored last search'),
+                worksheet.get_all_values
+            )
+            if not values:
+                return []
+            header = values[0][:len(STORED_SEARCH_HEADER)]
+            return [dict(zip(header, row)) for row in values[1 + offset:]]
+        if limit <= 0:
+            return []
+        first_row = offset + 2
+        cell_range = (
+            f"A{first_row}:{last_column_letter(STORED_SEARCH_HEADER)}"
+            f"{first_row + limit - 1}"
+        )
+        rows = SCHEDULER.read(
+            ('get', 'Stored last search', cell_range),
+            worksheet.get, cell_range
+        )
+        width = len(STORED_SEARCH_HEADER)
+        return [
+            dict(zip(STORED_SEARCH_HEADER, pad_row(row, width)))
+            for row in rows
+        ]
+
+    def note_stored_personas(self, response):
+        """
+        Keeps the stored persona count from an append response,
+        whose range ends at the last row of the sheet, including
+        the rows other sessions have appended before it.
+        """
+        last_row = appended_last_row(response)
+        if last_row is not None:
+            self.stored_persona_count = last_row - 1
+            self.stored_persona_counted_at = time.monotonic()
+
+    def count_stored_personas(self):
+        """
+        Returns the number of stored personas. The count an append
+        reported is used for INPUT_DATA_TTL seconds; after that, or
+        before this session has stored a persona, the first column
+        of 'Stored last search' is read to count them, which grows
+        with the sheet.
+        """
+        if self.stored_persona_count is None or \
+                time.monotonic() - self.stored_persona_counted_at > \
+                INPUT_DATA_TTL:
+            column = SCHEDULER.read(
+                ('col_values', 'Stored last search', 1),
+                get_worksheet('Stored last search').col_values, 1
+            )
+            self.stored_persona_count = max(len(column) - 1, 0)
+            self.stored_persona_counted_at = time.monotonic()
+        return self.stored_persona_count
+
+    def append_rows(self, target, rows, keys):
+        """
+        Appends a batch of rows to the target's worksheet in one
+        request, each followed by its submission key.
+        """
+        worksheet = get_worksheet(self.WORKSHEETS[target])
+        response = SCHEDULER.write(worksheet.append_rows, [
+            list(row) + [key] for row, key in zip(rows, keys)
+        ])
+        if target == 'stored_personas':
+            self.note_stored_personas(response)
+
+    def written_keys(self, target, keys):
+        """
+        Returns the submission keys that are already in the sheet.
+        """
+        title = self.WORKSHEETS[target]
+        column = SCHEDULER.read(
+            ('col_values', title, SUBMISSION_KEY_COLUMN),
+            get_worksheet(title).col_values, SUBMISSION_KEY_COLUMN
+        )
+        return set(keys) & set(column)
+
+
+class SqliteBackend:
+    """
+    The SqliteBackend class keeps the same data in a local SQLite
+    file, so the app can be run and load-tested without network
+    access or Google credentials. Respondents are indexed on
+    Gender, Age Group and Income Bracket, plus one covering index
+    over all three. The cube is built from the same paged reads as
+    with the sheet, so it always matches the cached responses.
+    """
+
+    TABLES = {
+        'respondents': 'respondents',
+        'stored_personas': 'stored_searches'
+    }
+
+    def __init__(self, path=SURVEY_DB):
+        self.source = f"sqlite:{os.path.abspath(path)}"
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS respondents (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                gender TEXT NOT NULL,
+                age_group TEXT NOT NULL,
+                income_bracket TEXT NOT NULL,
+                likelihood INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS respondents_gender
+                ON respondents (gender);
+            CREATE INDEX IF NOT EXISTS respondents_age_group
+                ON respondents (age_group);
+            CREATE INDEX IF NOT EXISTS respondents_income_bracket
+                ON respondents (income_bracket);
+            CREATE INDEX IF NOT EXISTS respondents_segment
+                ON respondents (gender, age_group, income_bracket,
+                                likelihood);
+            CREATE TABLE IF NOT EXISTS stored_searches (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                gender TEXT NOT NULL,
+                age_group TEXT NOT NULL,
+                income_bracket TEXT NOT NULL,
+                likelihood TEXT NOT NULL
+            );
+        """)
+        for table in self.TABLES.values():
+            columns = [
+                column[1] for column in self.connection.execute(
+                    f"PRAGMA table_info({table})"
+                )
+            ]
+            if 'submission_id' not in columns:
+                self.connection.execute(
+                    f"ALTER TABLE {table} ADD COLUMN submission_id TEXT"
+                )
+            self.connection.execute(
+                f"CREATE UNIQUE INDEX IF NOT EXISTS {table}_submission_id "
+                f"ON {table} (submission_id)"
+            )
+
+    def append_respondent(self, row):
+        """
+        Inserts one respondent row.
+        """
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT INTO respondents (gender, age_group, "
+                "income_bracket, likelihood) VALUES (?, ?, ?, ?)", row
+            )
+
+    def read_respondents(self, first_row=2):
+        """
+        Returns the header and the respondent rows from the given
+        row onwards, numbered as they would be in the sheet.
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT gender, age_group, income_bracket, likelihood "
+                "FROM respondents ORDER BY id LIMIT -1 OFFSET ?",
+                (max(first_row - 2, 0),)
+            ).fetchall()
+        return list(INPUT_DATA_HEADER), [list(row) for row in rows]
+
+    def read_respondent_pages(self, first_row=2, page_size=READ_PAGE_SIZE):
+        """
+        Yields (header, rows) for each page of up to page_size
+        respondent rows from the given row onwards, each row
+        followed by its submission key. Pages after the first
+        continue from the last id read, so each is one indexed
+        range scan.
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT id, gender, age_group, income_bracket, likelihood, "
+                "COALESCE(submission_id, '') FROM respondents "
+                "ORDER BY id LIMIT ? OFFSET ?",
+                (page_size, max(first_row - 2, 0))
+            ).fetchall()
+        while True:
+            yield list(INPUT_DATA_HEADER), [list(row[1:]) for row in rows]
+            if len(rows) < page_size:
+                return
+            with self.lock:
+                rows = self.connection.execute(
+                    "SELECT id, gender, age_group, income_bracket, "
+                    "likelihood, COALESCE(submission_id, '') "
+                    "FROM respondents WHERE id > ? "
+                    "ORDER BY id LIMIT ?", (rows[-1][0], page_size)
+                ).fetchall()
+
+    def append_stored_persona(self, row):
+        """
+        Inserts one stored persona row.
+        """
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT INTO stored_searches (gender, age_group, "
+                "income_bracket, likelihood) VALUES (?, ?, ?, ?)", row
+            )
+
+    def read_stored_personas(self, offset=0, limit=None):
+        """
+        Returns the stored personas as records, either all of them
+        or up to limit of them from the offset on.
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT gender, age_group, income_bracket, likelihood "
+                "FROM stored_searches ORDER BY id LIMIT ? OFFSET ?",
+                (-1 if limit is None else limit, offset)
+            ).fetchall()
+        return [dict(zip(STORED_SEARCH_HEADER, row)) for row in rows]
+
+    def count_stored_personas(self):
+        """
+        Returns the number of stored personas.
+        """
+        with self.lock:
+            return self.connection.execute(
+                "SELECT COUNT(*) FROM stored_searches"
+            ).fetchone()[0]
+
+    def append_rows(self, target, rows, keys):
+        """
+        Inserts a batch of rows into the target's table in one
+        transaction. Rows whose submission key is already stored
+        are skipped.
+        """
+        with self.lock, self.connection:
+            self.connection.executemany(
+                f"INSERT OR IGNORE INTO {self.TABLES[target]} (gender, "
+                "age_group, income_bracket, likelihood, submission_id) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [list(row) + [key] for row, key in zip(rows, keys)]
+            )
+
+    def written_keys(self, target, keys):
+        """
+        Returns the submission keys that are already stored.
+        """
+        keys = list(keys)
+        if not keys:
+            return set()
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT submission_id FROM {self.TABLES[target]} "
+                f"WHERE submission_id IN ({', '.join('?' * len(keys))})",
+                keys
+            ).fetchall()
+        return {row[0] for row in rows}
+
+
+class DaemonError(Exception):
+    """
+    Raised when the survey daemon cannot answer a request.
+    """
+
+
+class DaemonUnavailable(DaemonError):
+    """
+    Raised when the survey daemon cannot be reached at all.
+    """
+
+
+class DaemonBackend:
+    """
+    The DaemonBackend class forwards every storage call to a
+    shared survey daemon over a Unix socket, one JSON line per
+    request and response. The daemon owns the Google Sheets
+    client, the cached responses and the write path, so the
+    terminal sessions that use it stay thin and start fast.
+    """
+
+    def __init__(self, path=SURVEY_DAEMON):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = None
+        self.reader = None
+
+    def connect(self):
+        """
+        Opens the connection to the daemon.
+        """
+        self.connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.connection.connect(self.path)
+        self.reader = self.connection.makefile('rb')
+
+    def close(self):
+        """
+        Closes the connection, so the next call reconnects.
+        """
+        if self.connection is not None:
+            self.reader.close()
+            self.connection.close()
+        self.connection = None
+        self.reader = None
+
+    def call(self, method, *params):
+        """
+        Sends one request to the daemon and returns its result.
+        """
+        request = json.dumps({'method': method, 'params': params})
+        with self.lock:
+            try:
+                if self.connection is None:
+                    self.connect()
+                self.connection.sendall(request.encode() + b"\n")
+                line = self.reader.readline()
+            except OSError as error:
+                self.close()
+                raise DaemonUnavailable(
+                    f"Survey daemon unavailable: {error}"
+                )
+            if not line:
+                self.close()
+                raise DaemonUnavailable(
+                    "The survey daemon closed the connection."
+                )
+        response = json.loads(line)
+        if 'error' in response:
+            raise DaemonError(response['error'])
+        return response['result']
+
+    def append_respondent(self, row):
+        """
+        Asks the daemon to validate and write one respondent row.
+        """
+        self.call('append_respondent', row)
+
+    @property
+    def source(self):
+        """
+        The daemon's own backend, which holds the data.
+        """
+        return self.call('source')
+
+    def read_respondents(self, first_row=2):
+        """
+        Returns the header and respondent rows held by the daemon.
+        """
+        header, rows = self.call('read_respondents', first_row)
+        return header, rows
+
+    def read_respondent_pages(self, first_row=2, page_size=READ_PAGE_SIZE):
+        """
+        Yields (header, rows) for each page of up to page_size
+        respondent rows from the given row onwards, one request to
+        the daemon per page.
+        """
+        while True:
+            header, rows = self.call(
+                'read_respondent_page', first_row, page_size
+            )
+            yield header, rows
+            if len(rows) < page_size:
+                return
+            first_row += len(rows)
+
+    def segment_histograms(self):
+        """
+        Returns the daemon's segment histograms, which are at most
+        11 rows per Gender x Age Group x Income Bracket cell.
+        """
+        return self.call('segment_histograms')
+
+    def append_stored_persona(self, row):
+        """
+        Asks the daemon to write one stored persona row.
+        """
+        self.call('append_stored_persona', row)
+
+    def read_stored_personas(self, offset=0, limit=None):
+        """
+        Returns stored personas from the daemon, either all of them
+        or up to limit of them from the offset on.
+        """
+        return self.call('read_stored_personas', offset, limit)
+
+    def count_stored_personas(self):
+        """
+        Returns the number of stored personas from the daemon.
+        """
+        return self.call('count_stored_personas')
+
+    def append_rows(self, target, rows, keys):
+        """
+        Asks the daemon to write a batch of rows in one request.
+        """
+        self.call('append_rows', target, rows, keys)
+
+    def written_keys(self, target, keys):
+        """
+        Returns the submission keys the daemon's backend already
+        holds.
+        """
+        return set(self.call('written_keys', target, list(keys)))
+
+
+BACKENDS = {
+    'sheets': GoogleSheetsBackend,
+    'sqlite': SqliteBackend
+}
+BACKEND = None
+
+
+def get_backend():
+    """
+    Returns the storage backend chosen by SURVEY_BACKEND,
+    creating it on first use.
+    """
+    global BACKEND
+    if BACKEND is None:
+        BACKEND = BACKENDS[SURVEY_BACKEND]()
+    return BACKEND
+
+
+# Seconds the cached 'Input data' is trusted before it is synced
+# with the sheet to pick up rows written by other sessions
+INPUT_DATA_TTL = 300
+
+
+class SurveySnapshot:
+    """
+    The SurveySnapshot class keeps a single in-process copy of
+    the 'Input data' worksheet that every calculate_* function
+    reads from. The copy is downloaded on first use, and once it
+    is older than the TTL, sync() fetches only the rows appended
+    since the last known row, and falls back to a full reload if
+    the header or that last row no longer match. The rows this
+    session writes are counted in the cube as pending, by their
+    submission keys, and reach the copy in sheet order with the
+    next sync like any other row.
+    The version number is bumped whenever the responses change,
+    so anything derived from them can tell when it is outdated.
+    A lock serialises loading and updates so the snapshot can be
+    shared by the threads of a long-running service.
+
+    save() writes the responses and the cube histograms to a binary
+    file, so the next process can restore them and sync only the
+    rows added since, instead of downloading the whole sheet.
+    """
+
+    FORMAT = 2
+
+    def __init__(self, ttl=INPUT_DATA_TTL, path=SURVEY_SNAPSHOT):
+        self.lock = threading.RLock()
+        self.ttl = ttl
+        self.path = path
+        self.saved_version = None
+        self.version = 0
+        self.header = None
+        self.responses = None
+        self.loaded_at = 0
+        self.cube = None
+        self.cube_version = None
+        # Responses this session has written or queued, by
+        # submission key, counted in the cube until a sync reads them
+        self.pending = {}
+
+    def is_stale(self):
+        """
+        Returns True if the responses are missing or due for a sync.
+        """
+        return (self.responses is None or
+                time.monotonic() - self.loaded_at > self.ttl)
+
+    def expire(self):
+        """
+        Makes the next read sync, to pick up rows written elsewhere.
+        """
+        self.loaded_at = 0
+
+    @profile_calls('snapshot')
+    def refresh(self):
+        """
+        Downloads 'Input data' page by page and replaces the cached
+        responses. Each page is encoded into the columns before the
+        next one is fetched, so the rows of the whole sheet are
+        never held at once. Pending responses found in the sheet
+        are no longer counted separately.
+        """
+        with self.lock:
+            responses = ResponseColumns()
+            written = []
+            for header, rows in get_backend().read_respondent_pages():
+                written.extend(
+                    submission_key(row) for row in rows
+                    if submission_key(row) in self.pending
+                )
+                responses.extend(
+                    row_to_record(header, row) for row in rows
+                )
+            for key in written:
+                del self.pending[key]
+            self.header = header
+            self.responses = responses
+            self.loaded_at = time.monotonic()
+            self.version += 1
+            return self.responses
+
+    def load(self):
+        """
+        Restores the responses from the snapshot file and syncs
+        them with the sheet, or downloads the sheet if there is no
+        usable file.
+        """
+        with self.lock:
+            if self.path and self.restore():
+                self.sync()
+            else:
+                self.refresh()
+
+    @profile_calls('snapshot')
+    def restore(self):
+        """
+        Reads the snapshot file written by save(). Returns False if
+        it is missing, damaged or was written for another backend
+        or set of choices.
+        """
+        try:
+            with open(self.path, 'rb') as snapshot_file:
+                metadata = json.loads(snapshot_file.readline())
+                if metadata['format'] != self.FORMAT or \
+                        metadata['source'] != get_backend().source or \
+                        metadata['dimensions'] != ResponseColumns.DIMENSIONS:
+                    return False
+                responses = ResponseColumns.load(
+                    snapshot_file, metadata['rows']
+                )
+        except (OSError, ValueError, KeyError, EOFError):
+            return False
+        responses.last_record = metadata['last_record']
+        self.header = metadata['header']
+        self.responses = responses
+        self.version += 1
+        self.cube = self.with_pending(
+            SurveyCube.from_histograms(metadata['histograms'])
+        )
+        self.cube_version = self.version
+        self.saved_version = self.version
+        # Stale straight away, so the rows added since are synced
+        self.loaded_at = 0
+        return True
+
+    @profile_calls('snapshot')
+    def save(self):
+        """
+        Writes the responses and cube histograms to the snapshot file,
+        if they have changed since it was last written or read.
+        The file is replaced in one step, so a reader never sees it
+        half written.
+        """
+        with self.lock:
+            if not self.path or self.responses is None or \
+                    self.saved_version == self.version:
+                return
+            cube = self.get_cube()
+            if self.pending:
+                # The file holds what the backend holds, without the
+                # responses still waiting in the outbox
+                cube = SurveyCube.from_histograms(cube.histogram_rows())
+                for record in self.pending.values():
+                    cube.add(record, -1)
+            metadata = {
+                'format': self.FORMAT,
+                'source': get_backend().source,
+                'dimensions': ResponseColumns.DIMENSIONS,
+                'header': self.header,
+                'rows': len(self.responses),
+                'last_record': self.responses.last_record,
+                'histograms': cube.histogram_rows()
+            }
+            temporary_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(temporary_path, 'wb') as snapshot_file:
+                snapshot_file.write(json.dumps(metadata).encode() + b"\n")
+                self.responses.dump(snapshot_file)
+            os.replace(temporary_path, self.path)
+            self.saved_version = self.version
+
+    @profile_calls('snapshot')
+    def sync(self):
+        """
+        Fetches the header and the rows from the last known row
+        onwards, a page at a time, and appends the new rows to the
+        cached responses, passing on their submission keys so the
+        pending ones are not counted twice. If the header or the
+        last known row have changed, the sheet has been edited or
+        truncated and it is downloaded again. Returns the number of
+        rows added, or None if a full reload was needed.
+        """
+        with self.lock:
+            if self.responses is None:
+                self.load()
+                return None
+            last_row = len(self.responses) + 1
+            pages = get_backend().read_respondent_pages(max(last_row, 2))
+            added = 0
+            for page_number, (header, tail) in enumerate(pages):
+                keys = [submission_key(row) for row in tail]
+                tail = [pad_row(row, len(self.header)) for row in tail]
+                if page_number == 0:
+                    header = pad_row(header, len(self.header))
+                    changed = header != self.header
+                    if len(self.responses):
+                        expected_row = record_to_row(
+                            self.header, self.responses.last_record
+                        )
+                        changed = (changed or not tail or
+                                   tail[0] != expected_row)
+                        tail, keys = tail[1:], keys[1:]
+                    if changed:
+                        pages.close()
+                        self.refresh()
+                        return None
+                new_records = [
+                    row_to_record(self.header, row) for row in tail
+                ]
+                self.extend(new_records, keys)
+                added += len(new_records)
+            self.loaded_at = time.monotonic()
+            return added
+
+    def extend(self, records, keys=None):
+        """
+        Appends records to the cache and folds them into the cube
+        if it is up to date, instead of rebuilding it. Records
+        this session wrote, given by their submission keys, are
+        already in the cube.
+        """
+        with self.lock:
+            counted = [
+                self.pending.pop(key, None) is not None
+                for key in keys or [None] * len(records)
+            ]
+            if self.responses is None or not records:
+                return
+            cube_is_current = (self.cube is not None and
+                               self.cube_version == self.version)
+            self.responses.extend(records)
+            self.version += 1
+            if cube_is_current:
+                for record, is_counted in zip(records, counted):
+                    if not is_counted:
+                        self.cube.add(record)
+                self.cube_version = self.version
+
+    def add_pending(self, key, record):
+        """
+        Counts a response this session is writing, so it shows up
+        in the answers before a sync reads it back. It stays out of
+        the cached responses, which follow the backend row by row.
+        """
+        with self.lock:
+            self.pending[key] = record
+            if self.cube is not None and self.cube_version == self.version:
+                self.cube.add(record)
+
+    def discard_pending(self, keys):
+        """
+        Stops counting pending responses that were refused or could
+        not be written.
+        """
+        with self.lock:
+            cube_is_current = (self.cube is not None and
+                               self.cube_version == self.version)
+            for key in keys:
+                record = self.pending.pop(key, None)
+                if record is not None and cube_is_current:
+                    self.cube.add(record, -1)
+            # Sync on the next read, in case some were written anyway
+            self.expire()
+
+    def with_pending(self, cube):
+        """
+        Adds the queued responses to a cube built from the backend.
+        """
+        for record in self.pending.values():
+            cube.add(record)
+        return cube
+
+    def get_responses(self):
+        """
+        Returns the cached responses, loading or syncing them first
+        if they are stale.
+        """
+        with self.lock:
+            if self.responses is None:
+                self.load()
+            elif self.is_stale():
+                self.sync()
+            return self.responses
+
+    def get_cube(self):
+        """
+        Returns the SurveyCube for the cached responses, rebuilding
+        it only when they have changed since it was built. A
+        current cube is returned without taking the lock, so reads
+        are not held up while the outbox writes a batch.
+        """
+        cube = self.cube
+        if cube is not None and self.responses is not None and \
+                self.cube_version == self.version and not self.is_stale():
+            return cube
+        with self.lock:
+            responses = self.get_responses()
+            if self.cube is None or self.cube_version != self.version:
+                with profiled('aggregate', 'build cube'):
+                    self.cube = self.with_pending(SurveyCube.from_histograms(
+                        responses.segment_histograms()
+                    ))
+                self.cube_version = self.version
+            return self.cube
+
+
+class ResponseColumns:
+    """
+    The ResponseColumns class holds the survey responses column
+    by column instead of as a list of dicts. Gender, Age Group
+    and Income Bracket are stored as one-byte codes into the
+    choice tables and Likelihood as one unsigned byte, so each
+    respondent takes four bytes. Values that are not in a choice
+    table are coded as UNKNOWN, and a missing or invalid
+    Likelihood as MISSING.
+    """
+
+    DIMENSIONS = {
+        'Gender': list(GENDER_CHOICES.values()),
+        'Age Group': list(AGE_GROUP_CHOICES.values()),
+        'Income Bracket': list(INCOME_BRACKET_CHOICES.values())
+    }
+    UNKNOWN = -1
+    MISSING = 255
+
+    def __init__(self):
+        self.codes = {
+            dimension: {value: code for code, value in enumerate(values)}
+            for dimension, values in self.DIMENSIONS.items()
+        }
+        self.columns = {
+            dimension: array('b') for dimension in self.DIMENSIONS
+        }
+        self.likelihood = array('B')
+        self.last_record = None
+
+    def __len__(self):
+        return len(self.likelihood)
+
+    def append(self, record):
+        """
+        Encodes one record and appends it to the columns.
+        """
+        self.extend([record])
+
+    def extend(self, records):
+        """
+        Encodes and appends every record, one column at a time.
+        """
+        records = list(records)
+        if not records:
+            return
+        for dimension, column in self.columns.items():
+            codes = self.codes[dimension]
+            column.extend([
+                codes.get(record.get(dimension), self.UNKNOWN)
+                for record in records
+            ])
+        likelihoods = [
+            parse_likelihood(record.get('Likelihood', ''))
+            for record in records
+        ]
+        self.likelihood.extend([
+            self.MISSING if likelihood is None else likelihood
+            for likelihood in likelihoods
+        ])
+        self.last_record = records[-1]
+
+    def dump(self, snapshot_file):
+        """
+        Writes the columns to a binary file one after another, as
+        raw bytes.
+        """
+        for column in self.columns.values():
+            column.tofile(snapshot_file)
+        self.likelihood.tofile(snapshot_file)
+
+    @classmethod
+    def load(cls, snapshot_file, count):
+        """
+        Reads count rows of columns written by dump().
+        """
+        responses = cls()
+        for column in responses.columns.values():
+            column.fromfile(snapshot_file, count)
+        responses.likelihood.fromfile(snapshot_file, count)
+        return responses
+
+    def decode(self, dimension, code):
+        """
+        Returns the value a code stands for, or '' for UNKNOWN.
+        """
+        if code == self.UNKNOWN:
+            return ''
+        return self.DIMENSIONS[dimension][code]
+
+    @profile_calls('aggregate')
+    def segment_histograms(self):
+        """
+        Returns (gender, age group, income bracket, likelihood,
+        count) for every likelihood given in every cell. The codes
+        are counted in a single pass over the columns, which
+        Counter runs in C.
+        """
+        counts = Counter(zip(
+            self.columns['Gender'], self.columns['Age Group'],
+            self.columns['Income Bracket'], self.likelihood
+        ))
+        return [
+            (self.decode('Gender', gender),
+             self.decode('Age Group', age_group),
+             self.decode('Income Bracket', income_bracket),
+             likelihood, count)
+            for (gender, age_group, income_bracket, likelihood), count in
+            counts.items()
+            if likelihood != self.MISSING
+        ]
+
+
+def pad_row(row, width):
+    """
+    Returns the row as a list of strings padded to the given width,
+    since the Sheets API leaves out empty cells at the end of a row.
+    """
+    row = [str(value) for value in row[:width]]
+    return row + [''] * (width - len(row))
+
+
+def submission_key(row):
+    """
+    Returns the submission key that follows a respondent row, or
+    '' for a row written without one.
+    """
+    if len(row) < SUBMISSION_KEY_COLUMN:
+        return ''
+    return str(row[SUBMISSION_KEY_COLUMN - 1])
+
+
+def row_to_record(header, row):
+    """
+    Turns a row of cell values into a record keyed by the header,
+    with the Likelihood converted to an int where possible.
+    """
+    record = dict(zip(header, pad_row(row, len(header))))
+    likelihood = parse_likelihood(record.get('Likelihood', ''))
+    if likelihood is not None:
+        record['Likelihood'] = likelihood
+    return record
+
+
+def record_to_row(header, record):
+    """
+    Turns a record back into the cell values it was read from.
+    """
+    return [str(record.get(key, '')) for key in header]
+
+
+def parse_likelihood(value):
+    """
+    Converts a Likelihood cell to an int, or None if the
+    cell does not hold a whole number between 0 and 10.
+    """
+    value = str(value).strip()
+    if not value.isdigit() or int(value) > 10:
+        return None
+    return int(value)
+
+
+class SurveyCube:
+    """
+    The SurveyCube class aggregates the survey responses in a
+    single pass over Gender x Age Group x Income Bracket. Since
+    Likelihood is a whole number from 0 to 10, each cell holds an
+    11-bin histogram of it, which describes the responses fully,
+    and every roll-up of the cells is stored too, with None
+    standing for "any value". The search_by_*, combine_* and
+    create_persona answers, and the spread of each segment, are
+    then read from one histogram instead of scanning every record.
+    """
+
+    def __init__(self, records=()):
+        self.histograms = {}
+        for record in records:
+            self.add(record)
+
+    @classmethod
+    def from_histograms(cls, rows):
+        """
+        Builds a cube from (gender, age group, income bracket,
+        likelihood, count) rows that have already been aggregated.
+        """
+        cube = cls()
+        for gender, age_group, income_bracket, likelihood, count in rows:
+            cube.add_count(
+                gender, age_group, income_bracket, likelihood, count
+            )
+        return cube
+
+    def add(self, record, count=1):
+        """
+        Adds one response to its cell and to every roll-up of it,
+        or takes it back out with a count of -1. Returns False if
+        the response has no usable likelihood.
+        """
+        likelihood = parse_likelihood(record.get('Likelihood', ''))
+        if likelihood is None:
+            return False
+
+        self.add_count(
+            record.get('Gender'), record.get('Age Group'),
+            record.get('Income Bracket'), likelihood, count
+        )
+        return True
+
+    def add_count(self, gender, age_group, income_bracket, likelihood,
+                  count):
+        """
+        Adds count responses with the given likelihood to a cell
+        and every roll-up of it.
+        """
+        for key in [
+            (gender, age_group, income_bracket),
+            (gender, age_group, None),
+            (gender, None, income_bracket),
+            (None, age_group, income_bracket),
+            (gender, None, None),
+            (None, age_group, None),
+            (None, None, income_bracket),
+            (None, None, None)
+        ]:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [0] * LIKELIHOOD_BINS
+            histogram[likelihood] += count
+
+    def histogram(self, gender=None, age_group=None, income_bracket=None):
+        """
+        Returns the likelihood histogram of the requested segment,
+        one count per likelihood from 0 to 10.
+        """
+        histogram = self.histograms.get((gender, age_group, income_bracket))
+        if histogram is None:
+            return [0] * LIKELIHOOD_BINS
+        return list(histogram)
+
+    def lookup(self, gender=None, age_group=None, income_bracket=None):
+        """
+        Returns (count, likelihood sum) for the requested segment.
+        """
+        histogram = self.histogram(gender, age_group, income_bracket)
+        count = sum(histogram)
+        total = sum(
+            likelihood * bin_count
+            for likelihood, bin_count in enumerate(histogram)
+        )
+        return count, total
+
+    def histogram_rows(self):
+        """
+        Returns (gender, age group, income bracket, likelihood,
+        count) for every non-empty bin of every cell, which is
+        enough to rebuild the cube elsewhere.
+        """
+        return [
+            (*key, likelihood, count)
+            for key, histogram in self.histograms.items()
+            if None not in key
+            for likelihood, count in enumerate(histogram)
+            if count
+        ]
+
+    def likelihood_percentage(
+        self, gender=None, age_group=None, income_bracket=None
+    ):
+        """
+        Returns the mean likelihood of the segment as a percentage
+        of the 0-10 scale, or None if the segment has no responses.
+        """
+        count, total = self.lookup(gender, age_group, income_bracket)
+        if count == 0:
+            return None
+        return (total / (count * 10)) * 100
+
+    def likelihood_interval(
+        self, gender=None, age_group=None, income_bracket=None
+    ):
+        """
+        Returns the bootstrap confidence interval of the segment's
+        likelihood percentage, or None if it has no responses.
+        """
+        key = (gender, age_group, income_bracket)
+        return bootstrap_interval(self.histogram(*key), seed=repr(key))
+
+    def likelihood_intervals(self, segments):
+        """
+        Returns the bootstrap confidence intervals of many
+        (gender, age group, income bracket) segments at once, keyed
+        by segment, resampled in a pool of worker processes.
+        """
+        return bootstrap_intervals({
+            segment: self.histogram(*segment) for segment in segments
+        })
+
+    def distribution(self, gender=None, age_group=None, income_bracket=None):
+        """
+        Returns the count, mean, median, quartiles and standard
+        deviation of the segment's likelihoods, the shares of
+        promoters (9-10) and detractors (0-6) as percentages, and
+        the Net Promoter Score, the first share minus the second.
+        Returns None if the segment has no responses. Only the 11
+        bins are read, however many responses they count.
+        """
+        histogram = self.histogram(gender, age_group, income_bracket)
+        count = sum(histogram)
+        if count == 0:
+            return None
+        mean = sum(
+            likelihood * bin_count
+            for likelihood, bin_count in enumerate(histogram)
+        ) / count
+        variance = sum(
+            bin_count * (likelihood - mean) ** 2
+            for likelihood, bin_count in enumerate(histogram)
+        ) / count
+        promoters = sum(histogram[PROMOTER_LIKELIHOOD:]) / count * 100
+        detractors = sum(histogram[:PASSIVE_LIKELIHOOD]) / count * 100
+        return {
+            'count': count,
+            'mean': mean,
+            'median': histogram_quantile(histogram, 0.5),
+            'lower_quartile': histogram_quantile(histogram, 0.25),
+            'upper_quartile': histogram_quantile(histogram, 0.75),
+            'standard_deviation': math.sqrt(variance),
+            'promoters': promoters,
+            'detractors': detractors,
+            'net_promoter_score': promoters - detractors
+        }
+
+
+def histogram_quantile(histogram, fraction):
+    """
+    Returns the given quantile of the likelihoods a histogram
+    counts, interpolating between the two closest responses when
+    it falls between them, as statistics.quantiles does with
+    method='inclusive'.
+    """
+    count = sum(histogram)
+    position = (count - 1) * fraction
+    lower_rank = int(position)
+    ranks = [lower_rank, min(lower_rank + 1, count - 1)]
+    values = []
+    seen = 0
+    for likelihood, bin_count in enumerate(histogram):
+        seen += bin_count
+        while len(values) < 2 and seen > ranks[len(values)]:
+            values.append(likelihood)
+    lower, upper = values
+    return lower + (upper - lower) * (position - lower_rank)
+
+
+def binomial_variate(rng, trials, probability):
+    """
+    Draws the number of successes in trials independent trials that
+    each succeed with the given probability, with the same methods
+    as random.binomialvariate in Python 3.12: counting geometric
+    gaps when few successes are expected, and otherwise Hormann's
+    transformed rejection (BTRS), which takes a few uniform draws
+    however many trials there are.
+    """
+    if trials == 0 or probability <= 0.0:
+        return 0
+    if probability >= 1.0:
+        return trials
+    if probability > 0.5:
+        return trials - binomial_variate(rng, trials, 1.0 - probability)
+
+    if trials * probability < 10.0:
+        successes = position = 0
+        log_failure = math.log(1.0 - probability)
+        while True:
+            position += math.floor(
+                math.log(1.0 - rng.random()) / log_failure
+            ) + 1
+            if position > trials:
+                return successes
+            successes += 1
+
+    spread = math.sqrt(trials * probability * (1.0 - probability))
+    b = 1.15 + 2.53 * spread
+    a = -0.0873 + 0.0248 * b + 0.01 * probability
+    c = trials * probability + 0.5
+    squeeze = 0.92 - 4.2 / b
+    alpha = (2.83 + 5.1 / b) * spread
+    log_odds = math.log(probability / (1.0 - probability))
+    mode = math.floor((trials + 1) * probability)
+    log_mode = math.lgamma(mode + 1) + math.lgamma(trials - mode + 1)
+    while True:
+        u = rng.random() - 0.5
+        us = 0.5 - abs(u)
+        k = math.floor((2.0 * a / us + b) * u + c)
+        if k < 0 or k > trials:
+            continue
+        v = rng.random()
+        if us >= 0.07 and v <= squeeze:
+            return k
+        v *= alpha / (a / (us * us) + b)
+        if math.log(v) <= (log_mode - math.lgamma(k + 1) -
+                           math.lgamma(trials - k + 1) +
+                           (k - mode) * log_odds):
+            return k
+
+
+def bootstrap_interval(histogram, resamples=None, confidence=None,
+                       seed=None):
+    """
+    Returns the bootstrap percentile interval of the mean likelihood,
+    as percentages of the 0-10 scale, for the responses a histogram
+    counts, or None if it counts none. Resampling n responses with
+    replacement only changes how many fall in each of the 11 bins,
+    so each resample is drawn as one multinomial split of n, bin by
+    bin, and costs the same for 10 responses or 100,000.
+    """
+    resamples = resamples or BOOTSTRAP_RESAMPLES
+    confidence = confidence or BOOTSTRAP_CONFIDENCE
+    count = sum(histogram)
+    if count == 0:
+        return None
+    rng = random.Random(seed)
+    bins = [
+        (likelihood, bin_count)
+        for likelihood, bin_count in enumerate(histogram)
+        if bin_count
+    ]
+    means = []
+    for _ in range(resamples):
+        remaining_trials = remaining_weight = count
+        total = 0
+        for likelihood, bin_count in bins:
+            drawn = binomial_variate(
+                rng, remaining_trials, bin_count / remaining_weight
+            )
+            total += likelihood * drawn
+            remaining_trials -= drawn
+            remaining_weight -= bin_count
+        means.append(total / count)
+    means.sort()
+    tail = (1.0 - confidence) / 2
+    low = means[math.floor(tail * (resamples - 1))]
+    high = means[math.ceil((1.0 - tail) * (resamples - 1))]
+    return low * 10, high * 10
+
+
+def bootstrap_chunk(jobs, resamples, confidence):
+    """
+    Returns (key, interval) for each (key, histogram) job. Each
+    segment is seeded from its key, so its interval is the same
+    whichever process draws it.
+    """
+    return [
+        (key, bootstrap_interval(histogram, resamples, confidence,
+                                 repr(key)))
+        for key, histogram in jobs
+    ]
+
+
+@profile_calls('calculate')
+def bootstrap_intervals(histograms, resamples=None, confidence=None,
+                        workers=None):
+    """
+    Returns a dict of bootstrap intervals for a dict of segment
+    histograms, keyed the same way. With more than one segment the
+    resampling is spread over a pool of worker processes.
+    """
+    workers = workers or BOOTSTRAP_WORKERS or os.cpu_count() or 1
+    jobs = list(histograms.items())
+    if workers == 1 or len(jobs) < 2:
+        return dict(bootstrap_chunk(jobs, resamples, confidence))
+    chunks = [jobs[start::workers] for start in range(workers)]
+    intervals = {}
+    with ProcessPoolExecutor(workers) as pool:
+        for results in pool.map(
+            bootstrap_chunk, [chunk for chunk in chunks if chunk],
+            itertools.repeat(resamples), itertools.repeat(confidence)
+        ):
+            intervals.update(results)
+    return intervals
+
+
+class DaemonSnapshot:
+    """
+    The DaemonSnapshot class stands in for SurveySnapshot when the
+    terminal talks to a shared daemon. The responses stay in the
+    daemon, and the cube is rebuilt from the segment histograms it
+    sends back, so no rows are copied into the session process.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.lock = threading.RLock()
+
+    def get_cube(self):
+        """
+        Returns a SurveyCube built from the daemon's histograms.
+        """
+        return SurveyCube.from_histograms(self.backend.segment_histograms())
+
+    def sync(self):
+        """
+        The daemon keeps its own responses up to date.
+        """
+
+    def expire(self):
+        """
+        The daemon keeps its own responses up to date.
+        """
+
+    def add_pending(self, key, record):
+        """
+        The daemon counts the responses it writes itself.
+        """
+
+    def discard_pending(self, keys):
+        """
+        The daemon counts the responses it writes itself.
+        """
+
+    def extend(self, records, keys=None):
+        """
+        The daemon applies the responses it writes itself.
+        """
+
+    def save(self):
+        """
+        The daemon saves its own snapshot.
+        """
+
+
+SNAPSHOT = SurveySnapshot()
+
+
+def prefetch_survey_data(sync=False):
+    """
+    Loads and aggregates 'Input data' in a background thread, so
+    the answer is ready by the time the user has worked through
+    the prompts. With sync=True the rows other sessions have
+    added are fetched first. A query made while the thread is
+    still loading waits on the snapshot lock instead of starting
+    a second download.
+    """
+    def load():
+        try:
+            if sync:
+                SNAPSHOT.sync()
+            SNAPSHOT.get_cube()
+            SNAPSHOT.save()
+        except Exception:
+            # The next query loads the data itself and shows the error
+            pass
+
+    thread = threading.Thread(target=load, daemon=True)
+    thread.start()
+    return thread
+
+
+def connect_daemon(path):
+    """
+    Routes storage calls and queries through the survey daemon
+    listening on the given Unix socket. Returns False, leaving
+    the direct connection in place, if the daemon is not running.
+    """
+    global BACKEND, SNAPSHOT
+    backend = DaemonBackend(path)
+    try:
+        backend.connect()
+    except OSError:
+        return False
+    BACKEND = backend
+    SNAPSHOT = DaemonSnapshot(backend)
+    return True
+
+
+class Outbox:
+    """
+    The Outbox class makes writes durable before they reach the
+    storage backend. submit() appends the row to this process's
+    journal file and returns at once, and a background thread
+    drains the journal to the backend in batches. Every row has a
+    submission key, so a batch that is retried after a failure
+    skips the rows that already made it. Journals left behind by
+    sessions that died are adopted and drained on startup.
+    """
+
+    def __init__(self, directory=SURVEY_OUTBOX,
+                 batch_size=OUTBOX_BATCH_SIZE):
+        self.directory = directory
+        self.batch_size = batch_size
+        self.condition = threading.Condition()
+        self.pending = []
+        # Entries left to write one at a time after a batch was
+        # refused, to find the rows that caused it
+        self.isolating = 0
+        self.last_error = None
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(
+            directory, f"{os.getpid()}-{uuid.uuid4().hex[:8]}.jsonl"
+        )
+        self.journal = open(self.path, 'a')
+        if fcntl is not None:
+            fcntl.flock(self.journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self.adopt_orphaned_journals()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def adopt_orphaned_journals(self):
+        """
+        Queues the unwritten entries of journals that no running
+        session holds a lock on. Their rows may already have been
+        sent, so they are checked against the backend first. The
+        entries are copied into this session's journal before the
+        old one is removed, so they survive this session dying too.
+        """
+        if fcntl is None:
+            return
+        for path in sorted(glob.glob(os.path.join(self.directory,
+                                                  '*.jsonl'))):
+            if path == self.path:
+                continue
+            with open(path, 'a+') as journal:
+                try:
+                    fcntl.flock(journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    continue
+                journal.seek(0)
+                entries = {}
+                for line in journal:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A write cut short by a crash
+                        continue
+                    if entry['op'] == 'submit':
+                        entries[entry['key']] = entry
+                    else:
+                        entries.pop(entry['key'], None)
+                self.write_journal(entries.values())
+                os.remove(path)
+            for entry in entries.values():
+                entry['attempted'] = True
+                self.pending.append(entry)
+
+    def write_journal(self, entries):
+        """
+        Appends entries to the journal and flushes them to disk.
+        """
+        for entry in entries:
+            self.journal.write(json.dumps(entry) + "\n")
+        self.journal.flush()
+        os.fsync(self.journal.fileno())
+
+    def submit(self, target, row, key=None):
+        """
+        Records a row for the target and returns its submission key,
+        a new one unless given, once it is safely in the journal.
+        """
+        entry = {
+            'op': 'submit', 'key': key or uuid.uuid4().hex,
+            'target': target, 'row': list(row)
+        }
+        with self.condition:
+            self.write_journal([entry])
+            self.pending.append(entry)
+            self.condition.notify_all()
+        return entry['key']
+
+    def next_batch(self):
+        """
+        Waits for entries and returns the oldest ones that share a
+        target, up to the batch size, or only the oldest one while
+        the rows of a refused batch are being isolated.
+        """
+        with self.condition:
+            while not self.pending:
+                self.condition.wait()
+            target = self.pending[0]['target']
+            batch_size = 1 if self.isolating else self.batch_size
+            batch = []
+            for entry in self.pending:
+                if entry['target'] != target or len(batch) == batch_size:
+                    break
+                batch.append(entry)
+            return target, batch
+
+    def run(self):
+        """
+        Drains the journal to the backend until the process exits.
+        A batch that fails for a passing reason is retried after a
+        pause. A batch the backend refuses is written again one row
+        at a time, and the rows it still refuses are moved to the
+        rejected file, so they cannot hold up the rows behind them.
+        """
+        while True:
+            target, batch = self.next_batch()
+            try:
+                self.write_batch(target, batch)
+            except Exception as error:
+                for entry in batch:
+                    entry['attempted'] = True
+                self.report_error(target, batch, error)
+                if not is_rejected(error):
+                    time.sleep(OUTBOX_RETRY_DELAY)
+                    continue
+                if len(batch) > 1:
+                    self.isolating = len(batch)
+                    continue
+                self.reject(batch[0], error)
+            self.last_error = None
+            self.isolating = max(self.isolating - len(batch), 0)
+            with self.condition:
+                del self.pending[:len(batch)]
+                self.write_journal([
+                    {'op': 'done', 'key': entry['key']} for entry in batch
+                ])
+                self.condition.notify_all()
+
+    def report_error(self, target, batch, error):
+        """
+        Prints why a batch could not be written, once for as long as
+        the same error keeps coming back.
+        """
+        message = f"{type(error).__name__}: {error}"
+        if message == self.last_error:
+            return
+        self.last_error = message
+        print(Color.YELLOW + f"Could not save {len(batch)} {target} "
+              f"row(s) yet ({message}).\n" + Color.END, file=sys.stderr)
+
+    def reject(self, entry, error):
+        """
+        Moves an entry the backend refused to the rejected file, and
+        stops counting it in the cube.
+        """
+        rejection = dict(entry, error=f"{type(error).__name__}: {error}")
+        rejection.pop('op')
+        rejection.pop('attempted', None)
+        path = os.path.join(self.directory, OUTBOX_REJECTED)
+        with open(path, 'a') as rejected_file:
+            rejected_file.write(json.dumps(rejection) + "\n")
+        if entry['target'] == 'respondents':
+            SNAPSHOT.discard_pending([entry['key']])
+        print(Color.RED + f"A {entry['target']} row was refused and "
+              f"moved to {path}.\n" + Color.END, file=sys.stderr)
+
+    def write_batch(self, target, batch):
+        """
+        Writes one batch, leaving out rows a previous attempt has
+        already written.
+        """
+        backend = get_backend()
+        if any(entry.get('attempted') for entry in batch):
+            written = backend.written_keys(
+                target, [entry['key'] for entry in batch]
+            )
+            batch = [entry for entry in batch if entry['key'] not in written]
+        if not batch:
+            return
+        # Respondents stay counted as pending until a sync reads them
+        backend.append_rows(
+            target, [entry['row'] for entry in batch],
+            [entry['key'] for entry in batch]
+        )
+
+    def flush(self, timeout=None):
+        """
+        Waits until every submitted row has been written. Returns
+        False if rows are still waiting when the timeout runs out.
+        """
+        with self.condition:
+            return self.condition.wait_for(
+                lambda: not self.pending, timeout
+            )
+
+    def close(self):
+        """
+        Closes the journal, and removes it if nothing is pending.
+        """
+        with self.condition:
+            self.journal.close()
+            if not self.pending:
+                os.remove(self.path)
+
+
+OUTBOX = None
+
+
+def close_outbox(timeout=30):
+    """
+    Gives the outbox time to write what is still queued before the
+    program ends. Anything left is written by the next session.
+    """
+    if OUTBOX is None:
+        return
+    if not OUTBOX.flush(timeout):
+        print(Color.YELLOW + "Some answers could not be saved yet. They "
+              "will be saved the next time the survey starts.\n"
+              + Color.END)
+    OUTBOX.close()
+
+
+def save_snapshot():
+    """
+    Saves the snapshot for the next run. A failure only costs the
+    next run a full download, so it is reported and ignored.
+    """
+    try:
+        SNAPSHOT.save()
+    except OSError as error:
+        print(Color.YELLOW + f"Could not save the survey data for the "
+              f"next run: {error}\n" + Color.END)
+
+
+def get_outbox():
+    """
+    Returns the write-behind outbox, creating it on first use, or
+    None if writes go straight to the backend. Sessions that talk
+    to a daemon leave the journal to the daemon. Every entry point
+    calls it on startup, so the journals of crashed sessions are
+    drained even by sessions that only read.
+    """
+    global OUTBOX
+    if OUTBOX is None and SURVEY_OUTBOX and \
+            not isinstance(get_backend(), DaemonBackend):
+        OUTBOX = Outbox(SURVEY_OUTBOX)
+    return OUTBOX
 
 
 def welcome_message():
@@ -108,29 +2316,24 @@ def insert_data():
     print("\nInsert Data - Please provide the following information:\n")
     print(Color.UNDERLINE + "Choose Gender:\n" + Color.END)
 
-    gender_choices = {'M': 'Male', 'F': 'Female'}
     gender_input = input(
         "Enter the gender (M for Male, F for Female: \n"
     ).strip().upper()
 
-    while gender_input not in gender_choices:
+    while gender_input not in GENDER_CHOICES:
         print(Color.RED + "Invalid choice. Please choose either 'M' or 'F'.\n"
               + Color.END)
         gender_input = input("Gender (M/F): \n").strip().upper()
-    gender = gender_choices[gender_input]
+    gender = GENDER_CHOICES[gender_input]
 
-    age_group_choices = {
-        '1': '18-24', '2': '25-34', '3': '35-44',
-        '4': '45-54', '5': '55-64', '6': '65+'
-    }
     print(Color.UNDERLINE + "\nChoose Age Group:\n" + Color.END)
-    for key, value in age_group_choices.items():
+    for key, value in AGE_GROUP_CHOICES.items():
         print(f"{key}: {value}")
     age_group_input = input(
         "\nEnter the number corresponding to the age group: \n"
     ).strip()
 
-    while age_group_input not in age_group_choices:
+    while age_group_input not in AGE_GROUP_CHOICES:
         print(
           Color.RED + "Invalid choice. Please choose a number between 1 and 6."
           + Color.END)
@@ -138,27 +2341,23 @@ def insert_data():
             "\nEnter the number corresponding to the age group: \n"
         ).strip()
 
-    age_group = age_group_choices[age_group_input]
+    age_group = AGE_GROUP_CHOICES[age_group_input]
 
-    income_bracket_choices = {
-        '1': '$25,000-$49,999', '2': '$50,000-$74,999', '3': '$75,000-$99,999',
-        '4': '$100,000-$149,999', '5': '$150,000 or more'
-    }
     print(Color.UNDERLINE + "\nChoose Income Bracket:\n" + Color.END)
-    for key, value in income_bracket_choices.items():
+    for key, value in INCOME_BRACKET_CHOICES.items():
         print(f"{key}: {value}")
     income_bracket_input = input(
         "\nEnter the number corresponding to the income bracket: \n"
     ).strip()
 
-    while income_bracket_input not in income_bracket_choices:
+    while income_bracket_input not in INCOME_BRACKET_CHOICES:
         print(Color.RED +
               "Invalid choice. Please choose a number between 1 and 5.\n" +
               Color.END)
         income_bracket_input = input(
             "Enter the number corresponding to the income bracket: \n"
         ).strip()
-    income_bracket = income_bracket_choices[income_bracket_input]
+    income_bracket = INCOME_BRACKET_CHOICES[income_bracket_input]
 
     print(Color.UNDERLINE + f"\nEnter the likelihood of purchasing "
           f"a Apple Vision Pro (0-10 scale):\n" + Color.END)
@@ -176,19 +2375,94 @@ def insert_data():
 
     likelihood = int(likelihood_input)
 
-    sheet = GSPREAD_CLIENT.open('ProductSurvey')
-    input_data_worksheet = sheet.worksheet('Input data')
-    input_data_worksheet.append_row([
-        gender,
-        age_group,
-        income_bracket,
-        likelihood
-    ])
-    print(Color.GREEN +
-          "Data has been successfully inserted into the spreadsheet.\n" +
-          Color.END)
+    queued = save_response({
+        'Gender': gender,
+        'Age Group': age_group,
+        'Income Bracket': income_bracket,
+        'Likelihood': likelihood
+    })
+    prefetch_survey_data(sync=True)
+    if queued:
+        print(Color.GREEN +
+              "Data has been saved and is included in the results. It "
+              "will be uploaded to the spreadsheet in the background.\n" +
+              Color.END)
+    else:
+        print(Color.GREEN +
+              "Data has been successfully inserted into the spreadsheet.\n" +
+              Color.END)
+
+    return press_enter_to_main_menu()
 
-    press_enter_to_main_menu()
+
+def validate_response(record):
+    """
+    Checks a response against the choice tables insert_data
+    offers and returns it with the Likelihood as an int.
+    Raises ValueError if a value is missing or not a valid choice.
+    """
+    if not isinstance(record, dict):
+        raise ValueError("A response must be a JSON object.")
+    for key, choices in SEGMENT_KEYS.items():
+        if record.get(key) not in choices.values():
+            raise ValueError(f"Invalid value for {key}: {record.get(key)}")
+    likelihood = parse_likelihood(record.get('Likelihood', ''))
+    if likelihood is None:
+        raise ValueError(
+            f"Invalid value for Likelihood: {record.get('Likelihood')}"
+        )
+    return {
+        'Gender': record['Gender'],
+        'Age Group': record['Age Group'],
+        'Income Bracket': record['Income Bracket'],
+        'Likelihood': likelihood
+    }
+
+
+def save_response(record):
+    """
+    Queues a validated response in the outbox, or, without an
+    outbox, writes it to the storage backend straight away. Either
+    way it is counted in the cube as pending until a sync reads it
+    back. Returns True if the response was queued.
+    """
+    row = [record[key] for key in INPUT_DATA_HEADER]
+    outbox = get_outbox()
+    key = uuid.uuid4().hex
+    # Counted first, so a sync cannot read the row before it is pending
+    SNAPSHOT.add_pending(key, record)
+    try:
+        if outbox is not None:
+            outbox.submit('respondents', row, key)
+        else:
+            get_backend().append_rows('respondents', [row], [key])
+    except Exception:
+        SNAPSHOT.discard_pending([key])
+        raise
+    return outbox is not None
+
+
+def save_response_batch(rows, keys):
+    """
+    Writes a batch of validated respondent rows to the storage
+    backend in one request. The snapshot picks them up with the
+    next sync, in sheet order, instead of holding a copy of every
+    row of a large import.
+    """
+    get_backend().append_rows('respondents', rows, keys)
+    SNAPSHOT.expire()
+
+
+def save_stored_persona(row):
+    """
+    Queues a stored persona row in the outbox, or, without one,
+    writes it to the storage backend straight away.
+    """
+    outbox = get_outbox()
+    if outbox is not None:
+        outbox.submit('stored_personas', row)
+    else:
+        get_backend().append_stored_persona(row)
 
 
 def extract_analyzed_data():
@@ -198,49 +2472,33 @@ def extract_analyzed_data():
     such as gender, age group, income bracket, or combinations thereof to
     retrieve relevant information.
     """
-    clear_screen()
-    print()
-    print("Extract Analyzed Data:\n")
-    print(Color.UNDERLINE + "Choose one of the following options:" + Color.END)
-    print()
-    print("1. Search by Gender")
-    print("2. Search by Age Group")
-    print("3. Search by Income Bracket")
-    print("4. Combine Gender and Age Group")
-    print("5. Combine Gender and Income Bracket")
-    print("6. Combine Age Group and Income Bracket")
-    print(f"7. Create Persona (combination of "
-          f"gender, age group, and income bracket)")
-    print("8. Return to Main Menu\n")
-
-    choice = input("Enter your choice: \n")
-
-    if choice == '1':
-        # Search by Gender
-        search_by_gender()
-    elif choice == '2':
-        # Search by Age Group
-        search_by_age_group()
-    elif choice == '3':
-        # Search by Income Bracket
-        search_by_income_bracket()
-    elif choice == '4':
-        # Combine Gender and Age Group
-        combine_gender_and_age_group()
-    elif choice == '5':
-        # Combine Gender and Income Bracket
-        combine_gender_and_income_bracket()
-    elif choice == '6':
-        # Combine Age Group and Income Bracket
-        combine_age_group_and_income_bracket()
-    elif choice == '7':
-        # Create Persona (combination of gender, age group, and income bracket)
-        create_persona()
-    elif choice == '8':
-        return
+    with screen():
+        print()
+        print("Extract Analyzed Data:\n")
+        print(Color.UNDERLINE + "Choose one of the following options:" +
+              Color.END)
+        print()
+        print("1. Search by Gender")
+        print("2. Search by Age Group")
+        print("3. Search by Income Bracket")
+        print("4. Combine Gender and Age Group")
+        print("5. Combine Gender and Income Bracket")
+        print("6. Combine Age Group and Income Bracket")
+        print(f"7. Create Persona (combination of "
+              f"gender, age group, and income bracket)")
+        print("8. Full Report (every segment and persona)")
+        print("9. Return to Main Menu\n")
+        print("Enter your choice: ")
+
+    choice = input()
+
+    if choice in EXTRACT_MENU_ACTIONS:
+        return EXTRACT_MENU_ACTIONS[choice]()
+    elif choice == '9':
+        return 'main'
     else:
         print(Color.RED + "Invalid choice. Please try again.\n" + Color.END)
-        try_again_extract_data_menu()
+        return try_again_extract_data_menu()
 
 
 def search_by_gender():
@@ -266,31 +2524,29 @@ def search_by_gender():
     likelihood_gender = calculate_likelihood_gender(search_criteria)
 
     if likelihood_gender is not None:
+        interval = describe_interval(gender=search_criteria)
         print(Color.GREEN + f"Likelihood of purchase for {search_criteria} is "
-              f"{likelihood_gender:.2f}%\n" + Color.END)
+              f"{likelihood_gender:.2f}%{interval}\n" + Color.END)
+        print_distribution(gender=search_criteria)
     else:
         print(Color.RED +
               "Invalid gender criteria. Please choose 'Male' or 'Female'.\n" +
               Color.END)
 
-    press_enter_to_extract_data_menu()
+    return press_enter_to_extract_data_menu()
 
 
 def search_by_age_group():
     """
     Searches for the likelihood of purchase based on the selected age group.
     """
-    age_group_choices = {
-        '1': '18-24', '2': '25-34', '3': '35-44',
-        '4': '45-54', '5': '55-64', '6': '65+'
-    }
     print(Color.UNDERLINE + "\nChoose Age Group:\n" + Color.END)
-    for key, value in age_group_choices.items():
+    for key, value in AGE_GROUP_CHOICES.items():
         print(f"{key}: {value}")
     age_group_input = input(
         "\nEnter the number corresponding to the age group: \n"
     ).strip()
-    while age_group_input not in age_group_choices:
+    while age_group_input not in AGE_GROUP_CHOICES:
         print(Color.RED +
               "Invalid choice. Please choose a number between 1 and 6.\n" +
               Color.END)
@@ -298,12 +2554,14 @@ def search_by_age_group():
             "Enter the number corresponding to the age group: \n"
         ).strip()
 
-    age_group = age_group_choices[age_group_input]
+    age_group = AGE_GROUP_CHOICES[age_group_input]
     likelihood_age_group = calculate_likelihood_age_group(age_group)
+    interval = describe_interval(age_group=age_group)
     print(Color.GREEN +
           f"Likelihood of purchase for age group {age_group} is "
-          f"{likelihood_age_group:.2f}%\n" + Color.END)
-    press_enter_to_extract_data_menu()
+          f"{likelihood_age_group:.2f}%{interval}\n" + Color.END)
+    print_distribution(age_group=age_group)
+    return press_enter_to_extract_data_menu()
 
 
 def search_by_income_bracket():
@@ -311,17 +2569,13 @@ def search_by_income_bracket():
     Searches for the likelihood of purchase
     based on the selected income bracket.
     """
-    income_bracket_choices = {
-        '1': '$25,000-$49,999', '2': '$50,000-$74,999', '3': '$75,000-$99,999',
-        '4': '$100,000-$149,999', '5': '$150,000 or more'
-    }
     print(Color.UNDERLINE + "\nChoose Income Bracket:\n" + Color.END)
-    for key, value in income_bracket_choices.items():
+    for key, value in INCOME_BRACKET_CHOICES.items():
         print(f"{key}: {value}")
     income_bracket_input = input(
         "\nEnter the number corresponding to the income bracket: \n"
     ).strip()
-    while income_bracket_input not in income_bracket_choices:
+    while income_bracket_input not in INCOME_BRACKET_CHOICES:
         print(Color.RED +
               "Invalid choice. Please choose a number between 1 and 5.\n" +
               Color.END)
@@ -329,16 +2583,18 @@ def search_by_income_bracket():
             "Enter the number corresponding to the income bracket: "
         ).strip()
         print()
-    income_bracket = income_bracket_choices[income_bracket_input]
+    income_bracket = INCOME_BRACKET_CHOICES[income_bracket_input]
 
     likelihood_income_bracket = calculate_likelihood_income_bracket(
         income_bracket
     )
+    interval = describe_interval(income_bracket=income_bracket)
     print(Color.GREEN +
           f"Likelihood of purchase for customers in the income bracket "
-          f"{income_bracket} is {likelihood_income_bracket:.2f}%.\n" +
-          Color.END)
-    press_enter_to_extract_data_menu()
+          f"{income_bracket} is {likelihood_income_bracket:.2f}%"
+          f"{interval}.\n" + Color.END)
+    print_distribution(income_bracket=income_bracket)
+    return press_enter_to_extract_data_menu()
 
 
 def combine_gender_and_age_group():
@@ -360,38 +2616,37 @@ def combine_gender_and_age_group():
             print(Color.RED + "Invalid input. Please enter 'M' "
                   f"for Male or 'F' for Female.\n" + Color.END)
 
-    age_group_choices = {
-        '1': '18-24', '2': '25-34', '3': '35-44',
-        '4': '45-54', '5': '55-64', '6': '65+'
-    }
     print(Color.UNDERLINE + "\nChoose Age Group:\n" + Color.END)
-    for key, value in age_group_choices.items():
+    for key, value in AGE_GROUP_CHOICES.items():
         print(f"{key}: {value}")
     age_group_input = input(
         "\nEnter the number corresponding to the age group: \n"
     ).strip()
-    while age_group_input not in age_group_choices:
+    while age_group_input not in AGE_GROUP_CHOICES:
         print(Color.RED +
               "Invalid choice. Please choose a number between 1 and 6.\n" +
               Color.END)
         age_group_input = input(
             "Enter the number corresponding to the age group: \n"
         ).strip()
-    age_group = age_group_choices[age_group_input]
+    age_group = AGE_GROUP_CHOICES[age_group_input]
 
     likelihood_percentage = calculate_likelihood_gender_and_age_group(
         gender, age_group
     )
 
     if likelihood_percentage is not None:
+        interval = describe_interval(gender=gender, age_group=age_group)
         print(Color.GREEN + f"Likelihood of purchase for {gender} and "
-              f"{age_group} is {likelihood_percentage:.2f}%\n" + Color.END)
+              f"{age_group} is {likelihood_percentage:.2f}%{interval}\n" +
+              Color.END)
+        print_distribution(gender=gender, age_group=age_group)
     else:
         print(Color.RED +
               "\nNo data found for the specified combination.\n" +
               Color.END)
 
-    press_enter_to_extract_data_menu()
+    return press_enter_to_extract_data_menu()
 
 
 def combine_gender_and_income_bracket():
@@ -413,39 +2668,38 @@ def combine_gender_and_income_bracket():
             print(Color.RED + f"Invalid input. Please enter 'M' "
                   f"for Male or 'F' for Female.\n" + Color.END)
 
-    income_bracket_choices = {
-        '1': '$25,000-$49,999', '2': '$50,000-$74,999', '3': '$75,000-$99,999',
-        '4': '$100,000-$149,999', '5': '$150,000 or more'
-    }
     print(Color.UNDERLINE + "\nChoose Income Bracket:\n" + Color.END)
-    for key, value in income_bracket_choices.items():
+    for key, value in INCOME_BRACKET_CHOICES.items():
         print(f"{key}: {value}")
     income_bracket_input = input(
         "\nEnter the number corresponding to the income bracket: \n"
     ).strip()
-    while income_bracket_input not in income_bracket_choices:
+    while income_bracket_input not in INCOME_BRACKET_CHOICES:
         print(Color.RED +
               "Invalid choice. Please choose a number between 1 and 5.\n" +
               Color.END)
         income_bracket_input = input(
             "Enter the number corresponding to the income bracket: \n"
         ).strip()
-    income_bracket = income_bracket_choices[income_bracket_input]
+    income_bracket = INCOME_BRACKET_CHOICES[income_bracket_input]
 
     likelihood_percentage = calculate_likelihood_gender_and_income_bracket(
         gender, income_bracket
     )
 
     if likelihood_percentage is not None:
+        interval = describe_interval(gender=gender,
+                                     income_bracket=income_bracket)
         print(Color.GREEN + f"Likelihood of purchase for {gender} and "
-              f"{income_bracket} is {likelihood_percentage:.2f}%\n" +
-              Color.END)
+              f"{income_bracket} is {likelihood_percentage:.2f}%"
+              f"{interval}\n" + Color.END)
+        print_distribution(gender=gender, income_bracket=income_bracket)
     else:
         print(Color.RED +
               "\nNo data found for the specified combination.\n" +
               Color.END)
 
-    press_enter_to_extract_data_menu()
+    return press_enter_to_extract_data_menu()
 
 
 def combine_age_group_and_income_bracket():
@@ -453,58 +2707,54 @@ def combine_age_group_and_income_bracket():
     Searches for the likelihood of purchase based on the combination
     of age group and income bracket provided by the user.
     """
-    age_group_choices = {
-        '1': '18-24', '2': '25-34', '3': '35-44',
-        '4': '45-54', '5': '55-64', '6': '65+'
-    }
     print(Color.UNDERLINE + "\nChoose Age Group:\n" + Color.END)
-    for key, value in age_group_choices.items():
+    for key, value in AGE_GROUP_CHOICES.items():
         print(f"{key}: {value}")
     age_group_input = input(
         "\nEnter the number corresponding to the age group: \n"
         ).strip()
-    while age_group_input not in age_group_choices:
+    while age_group_input not in AGE_GROUP_CHOICES:
         print(Color.RED +
               "Invalid choice. Please choose a number between 1 and 6.\n" +
               Color.END)
         age_group_input = input(
             "Enter the number corresponding to the age group: \n"
         ).strip()
-    age_group = age_group_choices[age_group_input]
+    age_group = AGE_GROUP_CHOICES[age_group_input]
 
-    income_bracket_choices = {
-        '1': '$25,000-$49,999', '2': '$50,000-$74,999', '3': '$75,000-$99,999',
-        '4': '$100,000-$149,999', '5': '$150,000 or more'
-    }
     print(Color.UNDERLINE + "\nChoose Income Bracket:\n" + Color.END)
-    for key, value in income_bracket_choices.items():
+    for key, value in INCOME_BRACKET_CHOICES.items():
         print(f"{key}: {value}")
     income_bracket_input = input(
         "\nEnter the number corresponding to the income bracket: \n"
     ).strip()
-    while income_bracket_input not in income_bracket_choices:
+    while income_bracket_input not in INCOME_BRACKET_CHOICES:
         print(Color.RED +
               "Invalid choice. Please choose a number between 1 and 5.\n" +
               Color.END)
         income_bracket_input = input(
             "Enter the number corresponding to the income bracket: \n"
         ).strip()
-    income_bracket = income_bracket_choices[income_bracket_input]
+    income_bracket = INCOME_BRACKET_CHOICES[income_bracket_input]
 
     likelihood_percentage = calculate_likelihood_age_group_and_income_bracket(
         age_group, income_bracket
     )
 
     if likelihood_percentage is not None:
+        interval = describe_interval(age_group=age_group,
+                                     income_bracket=income_bracket)
         print(Color.GREEN + f"Likelihood of purchase for {age_group} and "
-              f"{income_bracket} is {likelihood_percentage:.2f}%\n" +
-              Color.END)
+              f"{income_bracket} is {likelihood_percentage:.2f}%"
+              f"{interval}\n" + Color.END)
+        print_distribution(age_group=age_group,
+                           income_bracket=income_bracket)
     else:
         print(Color.RED +
               "\nNo data found for the specified combination.\n" +
               Color.END)
 
-    press_enter_to_extract_data_menu()
+    return press_enter_to_extract_data_menu()
 
 
 def create_persona():
@@ -527,43 +2777,35 @@ def create_persona():
         ).strip().upper()
     gender = 'Male' if gender_input == 'M' else 'Female'
 
-    age_group_choices = {
-        '1': '18-24', '2': '25-34', '3': '35-44',
-        '4': '45-54', '5': '55-64', '6': '65+'
-    }
     print(Color.UNDERLINE + "\nChoose Age Group:\n" + Color.END)
-    for key, value in age_group_choices.items():
+    for key, value in AGE_GROUP_CHOICES.items():
         print(f"{key}: {value}")
     age_group_input = input(
         "\nEnter the number corresponding to the age group: \n"
     ).strip()
-    while age_group_input not in age_group_choices:
+    while age_group_input not in AGE_GROUP_CHOICES:
         print(Color.RED +
               "Invalid choice. Please choose a number between 1 and 6." +
               Color.END)
         age_group_input = input(
             "\nEnter the number corresponding to the age group: \n"
         ).strip()
-    age_group = age_group_choices[age_group_input]
+    age_group = AGE_GROUP_CHOICES[age_group_input]
 
-    income_bracket_choices = {
-        '1': '$25,000-$49,999', '2': '$50,000-$74,999', '3': '$75,000-$99,999',
-        '4': '$100,000-$149,999', '5': '$150,000 or more'
-    }
     print(Color.UNDERLINE + "\nChoose Income Bracket:\n" + Color.END)
-    for key, value in income_bracket_choices.items():
+    for key, value in INCOME_BRACKET_CHOICES.items():
         print(f"{key}: {value}")
     income_bracket_input = input(
         "\nEnter the number corresponding to the income bracket: \n"
     ).strip()
-    while income_bracket_input not in income_bracket_choices:
+    while income_bracket_input not in INCOME_BRACKET_CHOICES:
         print(Color.RED +
               "Invalid choice. Please choose a number between 1 and 5." +
               Color.END)
         income_bracket_input = input(
             "\nEnter the number corresponding to the income bracket: \n"
         ).strip()
-    income_bracket = income_bracket_choices[income_bracket_input]
+    income_bracket = INCOME_BRACKET_CHOICES[income_bracket_input]
 
     persona = {
         'Gender': gender,
@@ -575,8 +2817,11 @@ def create_persona():
         formatted_persona = ", ".join([
             f"{key}: {value}" for key, value in persona.items()
         ])
+        interval = describe_interval(gender, age_group, income_bracket)
         print(Color.GREEN + f"Likelihood of purchase for persona "
-              f"{formatted_persona} is {likelihood_percentage}\n" + Color.END)
+              f"{formatted_persona} is {likelihood_percentage}{interval}\n" +
+              Color.END)
+        print_distribution(gender, age_group, income_bracket)
         while True:
             store_option = input(
                 "Do you want to store the search results? (Y/N): \n"
@@ -601,192 +2846,521 @@ def create_persona():
               "Persona not avalible.\n" +
               Color.END)
 
-    press_enter_to_extract_data_menu()
+    return press_enter_to_extract_data_menu()
 
 
-def calculate_likelihood_gender(search_criteria):
+def full_report():
     """
-    Calculates the likelihood of purchase based on gender criteria.
+    Prints every marginal, every pairwise combination and all
+    personas as tables, and offers to save them as CSV or JSON.
     """
-    input_data_worksheet = SHEET.worksheet('Input data')
-    analyzed_data = input_data_worksheet.get_all_records()
+    report = build_full_report(SNAPSHOT.get_cube())
+    print_full_report(report)
 
-    total_male_records = 0
-    total_female_records = 0
-    total_male_likelihood_sum = 0
-    total_female_likelihood_sum = 0
+    while True:
+        save_option = input(
+            "Save the report as CSV, JSON or not at all? (C/J/N): \n"
+        ).strip().lower()
+        if save_option in ('c', 'csv'):
+            path = input("File name (report.csv): \n").strip()
+            write_report_csv(report, path or 'report.csv')
+            break
+        elif save_option in ('j', 'json'):
+            path = input("File name (report.json): \n").strip()
+            write_report_json(report, path or 'report.json')
+            break
+        elif save_option in ('n', 'no'):
+            break
+        else:
+            print(Color.RED +
+                  "Invalid choice. Please enter 'C', 'J' or 'N'.\n" +
+                  Color.END)
 
-    for record in analyzed_data:
-        if 'Gender' in record and record['Gender'] in ['Male', 'Female']:
-            if record['Gender'] == 'Male':
-                total_male_records += 1
-                total_male_likelihood_sum += record.get('Likelihood', 0)
-            else:
-                total_female_records += 1
-                total_female_likelihood_sum += record.get('Likelihood', 0)
+    return press_enter_to_extract_data_menu()
 
-    male_likelihood_percentage = (
-        (total_male_likelihood_sum / (total_male_records * 10)) * 100
-        if total_male_records > 0 else 0
-    )
-    female_likelihood_percentage = (
-        (total_female_likelihood_sum / (total_female_records * 10)) * 100
-        if total_female_records > 0 else 0
-    )
 
-    if search_criteria == 'Male':
-        return male_likelihood_percentage
-    elif search_criteria == 'Female':
-        return female_likelihood_percentage
-    else:
+@profile_calls('calculate')
+def calculate_likelihood_gender(search_criteria):
+    """
+    Calculates the likelihood of purchase based on gender criteria.
+    """
+    if search_criteria not in GENDER_CHOICES.values():
         return None
 
+    cube = SNAPSHOT.get_cube()
+    likelihood_percentage = cube.likelihood_percentage(
+        gender=search_criteria
+    )
+    return likelihood_percentage if likelihood_percentage is not None else 0
+
 
+@profile_calls('calculate')
 def calculate_likelihood_age_group(age_group):
     """
     Calculates the likelihood of purchase based on the selected age group.
     """
-    input_data_worksheet = SHEET.worksheet('Input data')
-    analyzed_data = input_data_worksheet.get_all_records()
+    cube = SNAPSHOT.get_cube()
+    likelihood_percentage = cube.likelihood_percentage(age_group=age_group)
+    return likelihood_percentage if likelihood_percentage is not None else 0
 
-    likelihood_values = [
-        int(str(record.get('Likelihood', 0))) for record in analyzed_data
-        if record.get('Age Group') == age_group
-        and str(record.get('Likelihood', 0)).isdigit()
-    ]
 
-    if not likelihood_values:
-        return 0
+@profile_calls('calculate')
+def calculate_likelihood_income_bracket(income_bracket):
+    """
+    Calculates the likelihood of purchase based on the selected income bracket.
+    """
+    cube = SNAPSHOT.get_cube()
+    likelihood_percentage = cube.likelihood_percentage(
+        income_bracket=income_bracket
+    )
+    return likelihood_percentage if likelihood_percentage is not None else 0
 
-    mean_likelihood = statistics.mean(likelihood_values)
-    mean_likelihood_percent = (mean_likelihood / 10) * 100
 
-    return mean_likelihood_percent
+@profile_calls('calculate')
+def calculate_likelihood_gender_and_age_group(gender, age_group):
+    """
+    Calculates the likelihood of purchase
+    based on the combination of gender and age group.
+    """
+    cube = SNAPSHOT.get_cube()
+    likelihood_percentage = cube.likelihood_percentage(
+        gender=gender, age_group=age_group
+    )
+    return likelihood_percentage if likelihood_percentage is not None else 0
 
 
-def calculate_likelihood_income_bracket(income_bracket):
+@profile_calls('calculate')
+def calculate_likelihood_gender_and_income_bracket(gender, income_bracket):
     """
-    Calculates the likelihood of purchase based on the selected income bracket.
+    Calculates the likelihood of purchase based
+    on the combination of gender and income bracket.
     """
-    input_data_worksheet = SHEET.worksheet('Input data')
-    analyzed_data = input_data_worksheet.get_all_records()
+    cube = SNAPSHOT.get_cube()
+    likelihood_percentage = cube.likelihood_percentage(
+        gender=gender, income_bracket=income_bracket
+    )
+    return likelihood_percentage if likelihood_percentage is not None else 0
 
-    likelihood_values = [
-        record.get('Likelihood', 0) for record in analyzed_data
-        if record.get('Income Bracket') == income_bracket
-    ]
 
-    if not likelihood_values:
-        return 0
+@profile_calls('calculate')
+def calculate_likelihood_age_group_and_income_bracket(
+    age_group, income_bracket
+):
+    """
+    Calculates the likelihood of purchase based on
+    the combination of age group and income bracket.
+    """
+    cube = SNAPSHOT.get_cube()
+    likelihood_percentage = cube.likelihood_percentage(
+        age_group=age_group, income_bracket=income_bracket
+    )
+    return likelihood_percentage if likelihood_percentage is not None else 0
 
-    mean_likelihood = statistics.mean(likelihood_values)
-    mean_likelihood_percent = (mean_likelihood / 10) * 100
 
-    return mean_likelihood_percent
+@profile_calls('calculate')
+def calculate_likelihood_persona(persona):
+    """
+    Calculates the likelihood of purchase for a specified
+    persona based on gender, age group, and income bracket.
+    """
+    cube = SNAPSHOT.get_cube()
+    likelihood_percentage = cube.likelihood_percentage(
+        gender=persona['Gender'],
+        age_group=persona['Age Group'],
+        income_bracket=persona['Income Bracket']
+    )
 
+    if likelihood_percentage is None:
+        return None
 
-def calculate_likelihood_gender_and_age_group(gender, age_group):
+    likelihood_percentage = round(likelihood_percentage, 2)
+    likelihood_percentage = f"{likelihood_percentage}%"
+
+    return likelihood_percentage
+
+
+@profile_calls('calculate')
+def calculate_distribution(gender=None, age_group=None, income_bracket=None):
     """
-    Calculates the likelihood of purchase
-    based on the combination of gender and age group.
+    Calculates the spread of likelihood for a segment from its
+    histogram: median, quartiles, standard deviation, promoter
+    share and Net Promoter Score. Returns None without responses.
     """
-    input_data_worksheet = SHEET.worksheet('Input data')
-    analyzed_data = input_data_worksheet.get_all_records()
+    cube = SNAPSHOT.get_cube()
+    return cube.distribution(gender, age_group, income_bracket)
 
-    likelihood_values = [
-        int(str(record.get('Likelihood', 0))) for record in analyzed_data if
-        record.get('Gender') == gender
-        and record.get('Age Group') == age_group
-        and str(record.get('Likelihood', 0)).isdigit()
-    ]
 
-    if not likelihood_values:
-        return 0
+@profile_calls('calculate')
+def calculate_interval(gender=None, age_group=None, income_bracket=None):
+    """
+    Calculates the number of responses of a segment and the
+    bootstrap confidence interval of its likelihood percentage.
+    Returns None if the segment has no responses.
+    """
+    cube = SNAPSHOT.get_cube()
+    interval = cube.likelihood_interval(gender, age_group, income_bracket)
+    if interval is None:
+        return None
+    count, _ = cube.lookup(gender, age_group, income_bracket)
+    return count, interval
 
-    mean_likelihood = statistics.mean(likelihood_values)
-    mean_likelihood_percent = (mean_likelihood / 10) * 100
 
-    return mean_likelihood_percent
+def format_interval(count, interval):
+    """
+    Returns the sample size and confidence interval to print after
+    a likelihood percentage.
+    """
+    low, high = interval
+    return (f" (n={count}, {BOOTSTRAP_CONFIDENCE:.0%} CI "
+            f"{low:.2f}-{high:.2f}%)")
 
 
-def calculate_likelihood_gender_and_income_bracket(gender, income_bracket):
+def describe_interval(gender=None, age_group=None, income_bracket=None):
     """
-    Calculates the likelihood of purchase based
-    on the combination of gender and income bracket.
+    Returns the sample size and confidence interval of a segment
+    to print after its likelihood, or '' if intervals are off or
+    the segment has no responses.
     """
-    input_data_worksheet = SHEET.worksheet('Input data')
-    analyzed_data = input_data_worksheet.get_all_records()
+    if not SHOW_INTERVALS:
+        return ''
+    result = calculate_interval(gender, age_group, income_bracket)
+    if result is None:
+        return ''
+    return format_interval(*result)
 
-    likelihood_values = [
-        int(str(record.get('Likelihood', 0))) for record in analyzed_data if
-        record.get('Gender') == gender
-        and record.get('Income Bracket') == income_bracket
-        and str(record.get('Likelihood', 0)).isdigit()
-    ]
 
-    if not likelihood_values:
-        return 0
+def print_distribution(gender=None, age_group=None, income_bracket=None):
+    """
+    Prints the spread of likelihood for a segment under its
+    likelihood of purchase, if the segment has any responses.
+    """
+    distribution = calculate_distribution(gender, age_group, income_bracket)
+    if distribution is None:
+        return
+    print(f"Responses: {distribution['count']}, "
+          f"median {distribution['median']:g}, "
+          f"quartiles {distribution['lower_quartile']:g}-"
+          f"{distribution['upper_quartile']:g}, "
+          f"standard deviation {distribution['standard_deviation']:.2f}")
+    print(f"Promoters (9-10): {distribution['promoters']:.1f}%, "
+          f"detractors (0-6): {distribution['detractors']:.1f}%, "
+          f"NPS: {distribution['net_promoter_score']:+.0f}\n")
 
-    mean_likelihood = statistics.mean(likelihood_values)
-    mean_likelihood_percent = (mean_likelihood / 10) * 100
 
-    return mean_likelihood_percent
+SEGMENT_KEYS = {
+    'Gender': GENDER_CHOICES,
+    'Age Group': AGE_GROUP_CHOICES,
+    'Income Bracket': INCOME_BRACKET_CHOICES
+}
 
 
-def calculate_likelihood_age_group_and_income_bracket(
-    age_group, income_bracket
-):
+def answer_query(cube, query):
     """
-    Calculates the likelihood of purchase based on
-    the combination of age group and income bracket.
+    Answers one segment query, a dict with any of the keys
+    'Gender', 'Age Group' and 'Income Bracket', from the cube,
+    with the spread of its likelihoods alongside the percentage,
+    and its bootstrap confidence interval if SHOW_INTERVALS is on.
+    Raises ValueError if the query has an unknown key or value.
     """
-    input_data_worksheet = SHEET.worksheet('Input data')
-    analyzed_data = input_data_worksheet.get_all_records()
+    if not isinstance(query, dict):
+        raise ValueError("A query must be a JSON object.")
+    for key, value in query.items():
+        if key not in SEGMENT_KEYS:
+            raise ValueError(f"Unknown segment key: {key}")
+        if value not in SEGMENT_KEYS[key].values():
+            raise ValueError(f"Unknown value for {key}: {value}")
+
+    gender = query.get('Gender')
+    age_group = query.get('Age Group')
+    income_bracket = query.get('Income Bracket')
+    count, _ = cube.lookup(gender, age_group, income_bracket)
+    likelihood_percentage = cube.likelihood_percentage(
+        gender, age_group, income_bracket
+    )
+    if likelihood_percentage is not None:
+        likelihood_percentage = round(likelihood_percentage, 2)
+    distribution = cube.distribution(gender, age_group, income_bracket)
+    if distribution is not None:
+        del distribution['count']
+        distribution = {
+            key: round(value, 2) for key, value in distribution.items()
+        }
+    result = {
+        'query': query,
+        'count': count,
+        'likelihood_percentage': likelihood_percentage,
+        'distribution': distribution
+    }
+    if SHOW_INTERVALS:
+        interval = cube.likelihood_interval(gender, age_group, income_bracket)
+        result['interval'] = interval and [
+            round(value, 2) for value in interval
+        ]
+    return result
+
+
+REPORT_LEVELS = [
+    ('Gender',),
+    ('Age Group',),
+    ('Income Bracket',),
+    ('Gender', 'Age Group'),
+    ('Gender', 'Income Bracket'),
+    ('Age Group', 'Income Bracket'),
+    ('Gender', 'Age Group', 'Income Bracket')
+]
+REPORT_FIELDS = [
+    'Segment', 'Gender', 'Age Group', 'Income Bracket',
+    'Count', 'Mean Likelihood', 'Likelihood %'
+]
+INTERVAL_FIELDS = ['CI Low %', 'CI High %']
+
 
-    likelihood_values = [
-        int(str(record.get('Likelihood', 0))) for record in analyzed_data if
-        record.get('Age Group') == age_group
-        and record.get('Income Bracket') == income_bracket
-        and str(record.get('Likelihood', 0)).isdigit()
+def build_full_report(cube, intervals=None):
+    """
+    Returns one row for every marginal, every pairwise combination
+    and every persona, all read from the same cube. With intervals
+    (by default when SHOW_INTERVALS is on) each row also gets the
+    bootstrap confidence interval of its likelihood, all of them
+    resampled together in a process pool.
+    """
+    if intervals is None:
+        intervals = SHOW_INTERVALS
+    segments = [
+        dict(zip(level, values))
+        for level in REPORT_LEVELS
+        for values in itertools.product(
+            *(SEGMENT_KEYS[key].values() for key in level)
+        )
+    ]
+    keys = [
+        (segment.get('Gender'), segment.get('Age Group'),
+         segment.get('Income Bracket'))
+        for segment in segments
     ]
+    if intervals:
+        intervals = cube.likelihood_intervals(keys)
+
+    report = []
+    for segment, key in zip(segments, keys):
+        gender, age_group, income_bracket = key
+        count, total = cube.lookup(gender, age_group, income_bracket)
+        row = {
+            'Segment': ' x '.join(segment),
+            'Gender': gender or '',
+            'Age Group': age_group or '',
+            'Income Bracket': income_bracket or '',
+            'Count': count,
+            'Mean Likelihood': round(total / count, 2) if count else None,
+            'Likelihood %': (
+                round(total / (count * 10) * 100, 2) if count else None
+            )
+        }
+        if intervals:
+            interval = intervals[key] or (None, None)
+            for field, value in zip(INTERVAL_FIELDS, interval):
+                row[field] = None if value is None else round(value, 2)
+        report.append(row)
+    return report
+
+
+def print_full_report(report):
+    """
+    Prints the report as one table per segment level, with the
+    confidence intervals in a last column if the report has them.
+    """
+    has_intervals = bool(report) and INTERVAL_FIELDS[0] in report[0]
+    interval_heading = (f"{BOOTSTRAP_CONFIDENCE:.0%} CI"
+                        if has_intervals else '')
+    for segment, rows in itertools.groupby(report, lambda row: row['Segment']):
+        print(Color.UNDERLINE + f"\n{segment}\n" + Color.END)
+        print(f"{'':<40}{'Count':>8}{'Mean':>8}{'%':>9}"
+              f"{interval_heading:>18}")
+        for row in rows:
+            label = " / ".join(
+                row[key] for key in SEGMENT_KEYS if row[key]
+            )
+            if row['Count']:
+                interval = ''
+                if has_intervals:
+                    interval = (f"{row['CI Low %']:.2f}-"
+                                f"{row['CI High %']:.2f}%")
+                print(f"{label:<40}{row['Count']:>8}"
+                      f"{row['Mean Likelihood']:>8.2f}"
+                      f"{row['Likelihood %']:>8.2f}%{interval:>18}")
+            else:
+                print(f"{label:<40}{0:>8}{'-':>8}{'-':>9}"
+                      f"{'-' if has_intervals else '':>18}")
+    print()
 
-    if not likelihood_values:
-        return 0
 
-    mean_likelihood = statistics.mean(likelihood_values)
-    mean_likelihood_percent = (mean_likelihood / 10) * 100
+def write_report_csv(report, path):
+    """
+    Writes the report rows to a CSV file.
+    """
+    with open(path, 'w', newline='') as report_file:
+        fieldnames = REPORT_FIELDS
+        if report and INTERVAL_FIELDS[0] in report[0]:
+            fieldnames = REPORT_FIELDS + INTERVAL_FIELDS
+        writer = csv.DictWriter(report_file, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(report)
+    print(Color.GREEN + f"Report saved to {path}.\n" + Color.END)
 
-    return mean_likelihood_percent
 
+def write_report_json(report, path):
+    """
+    Writes the report rows to a JSON file.
+    """
+    with open(path, 'w') as report_file:
+        json.dump(report, report_file, indent=2)
+    print(Color.GREEN + f"Report saved to {path}.\n" + Color.END)
 
-def calculate_likelihood_persona(persona):
+
+def batch_query(query_file, output_file):
     """
-    Calculates the likelihood of purchase for a specified
-    persona based on gender, age group, and income bracket.
+    Reads one JSON segment query per line from query_file and
+    writes one JSON result per line to output_file. The data is
+    fetched once and every query is answered from the same cube.
     """
-    input_data_worksheet = SHEET.worksheet('Input data')
-    analyzed_data = input_data_worksheet.get_all_records()
+    cube = SNAPSHOT.get_cube()
+    for line in query_file:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            result = answer_query(cube, json.loads(line))
+        except ValueError as error:
+            result = {'query': line, 'error': str(error)}
+        output_file.write(json.dumps(result) + "\n")
+        output_file.flush()
+
+
+def read_import_file(import_file, file_format):
+    """
+    Yields (line number, record) for each respondent in a CSV file
+    with a header row or a JSON lines file, reading one line at a
+    time. A line that is not valid JSON is yielded with the
+    ValueError in place of the record.
+    """
+    if file_format == 'csv':
+        reader = csv.DictReader(import_file)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line_number, line in enumerate(import_file, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError as error:
+            yield line_number, error
 
-    matching_records = [
-        record for record in analyzed_data if all(
-            key != 'Likelihood' and
-            record.get(key) == value for key, value in persona.items()
-        )
-    ]
 
-    if not matching_records:
-        return None
+def import_source(import_file):
+    """
+    Returns what identifies the file being imported from one run to
+    the next: its absolute path, or a random name for a pipe or
+    stdin, whose lines cannot be recognised when they are sent again.
+    """
+    name = getattr(import_file, 'name', None)
+    if not isinstance(name, str) or not os.path.isfile(name):
+        return uuid.uuid4().hex
+    return os.path.abspath(name)
 
-    total_records = len(matching_records)
-    total_likelihood = sum(
-        record.get('Likelihood', 0) for record in matching_records
-    )
 
-    likelihood_percentage = (total_likelihood / (total_records * 10)) * 100
-    likelihood_percentage = round(likelihood_percentage, 2)
-    likelihood_percentage = f"{likelihood_percentage}%"
+def import_key(source, line_number):
+    """
+    Returns the submission key of the respondent on a line of an
+    imported file, the same every time the file is imported.
+    """
+    return hashlib.sha1(f"{source}:{line_number}".encode()).hexdigest()[:32]
 
-    return likelihood_percentage
+
+def import_respondents(import_file, file_format='csv', start_line=1,
+                       chunk_size=IMPORT_CHUNK_SIZE, rejects_file=None):
+    """
+    Streams respondents from import_file into the storage backend.
+    Every row is checked like an answer given through insert_data,
+    and the valid rows are written in chunks of chunk_size rows,
+    one append_rows request each, so memory use does not grow with
+    the file. Rejected rows are written to rejects_file as JSON
+    lines, or printed. Returns the number of imported and
+    rejected rows.
+
+    Each row's submission key comes from the file and line number,
+    so when an import is run again after it stopped, the rows that
+    already reached the backend are found by their keys and
+    skipped, until a chunk turns up with none of them stored.
+    """
+    imported = rejected = skipped = 0
+    rows, keys = [], []
+    first_line = start_line
+    source = import_source(import_file)
+    # Set while the chunks may have been written by an earlier run
+    resuming = True
+    started_at = time.monotonic()
+
+    def write_chunk():
+        nonlocal imported, skipped, resuming
+        try:
+            if resuming:
+                written = get_backend().written_keys('respondents', keys)
+                resuming = bool(written)
+                skipped += len(written)
+                unwritten = [
+                    (row, key) for row, key in zip(rows, keys)
+                    if key not in written
+                ]
+                rows[:] = [row for row, key in unwritten]
+                keys[:] = [key for row, key in unwritten]
+            if rows:
+                save_response_batch(rows, keys)
+        except Exception:
+            print(Color.RED + f"\nThe import stopped while saving the "
+                  f"rows from line {first_line} on. Run it again with "
+                  f"--start-line {first_line} to continue." + Color.END)
+            raise
+        imported += len(rows)
+        rows.clear()
+        keys.clear()
+        elapsed = time.monotonic() - started_at
+        print(f"\rImported {imported} rows, rejected {rejected} "
+              f"({imported / elapsed:.0f} rows/s)", end='', flush=True)
+
+    for line_number, record in read_import_file(import_file, file_format):
+        if line_number < start_line:
+            continue
+        if not rows:
+            first_line = line_number
+        try:
+            if isinstance(record, ValueError):
+                raise record
+            record = validate_response(record)
+        except ValueError as error:
+            rejected += 1
+            rejection = {'line': line_number, 'error': str(error)}
+            if rejects_file is None:
+                print("\r\033[K" + Color.YELLOW +
+                      f"Line {line_number}: {error}" + Color.END)
+            else:
+                rejects_file.write(json.dumps(rejection) + "\n")
+            continue
+        rows.append([record[key] for key in INPUT_DATA_HEADER])
+        keys.append(import_key(source, line_number))
+        if len(rows) == chunk_size:
+            write_chunk()
+    if rows:
+        write_chunk()
+
+    elapsed = time.monotonic() - started_at
+    print(Color.GREEN + f"\nImported {imported} rows and rejected "
+          f"{rejected} in {elapsed:.1f} seconds "
+          f"({imported / max(elapsed, 1e-9):.0f} rows/s).\n" + Color.END)
+    if skipped:
+        print(f"Skipped {skipped} rows an earlier run had already "
+              f"imported.\n")
+    return imported, rejected
 
 
 def store_search_result(persona, likelihood_percentage):
@@ -794,9 +3368,7 @@ def store_search_result(persona, likelihood_percentage):
     Stores the search results of a persona
     along with its likelihood of purchase.
     """
-    sheet = GSPREAD_CLIENT.open('ProductSurvey')
-    stored_search_worksheet = sheet.worksheet('Stored last search')
-    stored_search_worksheet.append_row([
+    save_stored_persona([
         persona['Gender'],
         persona['Age Group'],
         persona['Income Bracket'],
@@ -809,65 +3381,123 @@ def view_stored_data():
     Provides a menu for viewing stored search data, including options
     to view the last search persona or all stored search personas.
     """
-    clear_screen()
-    print("\nView Stored Data:")
-    print()
-    print(Color.UNDERLINE +
-          "Choose one of the following options:\n" +
-          Color.END)
-    print("1. View Last Search Persona")
-    print("2. View All Stored Search Personas")
-    print("3. Return to Main Menu\n")
+    with screen():
+        print("\nView Stored Data:")
+        print()
+        print(Color.UNDERLINE +
+              "Choose one of the following options:\n" +
+              Color.END)
+        print("1. View Last Search Persona")
+        print("2. View All Stored Search Personas")
+        print("3. Return to Main Menu\n")
+        print("Enter your choice: ")
 
-    choice = input("Enter your choice: \n")
+    choice = input()
 
     if choice == '1':
-        view_last_search_persona()
+        return view_last_search_persona()
     elif choice == '2':
-        view_all_stored_search_personas()
+        return view_all_stored_search_personas()
     elif choice == '3':
-        return
+        return 'main'
     else:
         print(Color.RED + "\nInvalid choice. Please try again.\n" + Color.END)
+        return 'main'
+
+
+def wait_for_stored_personas():
+    """
+    Gives personas stored in this session that are still in the
+    outbox a moment to be written, so the views below show them.
+    """
+    if OUTBOX is not None:
+        OUTBOX.flush(STORED_PERSONAS_FLUSH_TIMEOUT)
 
 
 def view_last_search_persona():
     """
-    Displays the details of the last searched persona.
+    Displays the details of the last searched persona. Only the
+    count and the final row are read, not every stored persona.
     """
-    sheet = GSPREAD_CLIENT.open('ProductSurvey')
-    stored_search_worksheet = sheet.worksheet('Stored last search')
-    all_stored_search_personas = stored_search_worksheet.get_all_records()
+    wait_for_stored_personas()
+    backend = get_backend()
+    count = backend.count_stored_personas()
 
-    if all_stored_search_personas:
-        last_search_persona = all_stored_search_personas[-1]
+    if count:
+        last_search_persona = backend.read_stored_personas(count - 1, 1)[0]
         print(Color.UNDERLINE + "\nLast Search Persona:\n" + Color.END)
-        for key, value in last_search_persona.items():
-            print(Color.GREEN + f"{key}: {value}" + Color.END)
+        print("\n".join(
+            Color.GREEN + f"{key}: {value}" + Color.END
+            for key, value in last_search_persona.items()
+        ))
     else:
         print(Color.RED + "\nNo available data\n" + Color.END)
 
     print()
-    press_enter_to_stored_data_menu()
+    return press_enter_to_stored_data_menu()
 
 
-def view_all_stored_search_personas():
+def format_persona_page(personas, first_number):
+    """
+    Returns a page of stored personas as one table, a line each.
+    """
+    widths = [
+        max([len(key)] + [len(str(persona.get(key, '')))
+                          for persona in personas])
+        for key in STORED_SEARCH_HEADER
+    ]
+    lines = [Color.UNDERLINE + "#     " + "  ".join(
+        key.ljust(width) for key, width in zip(STORED_SEARCH_HEADER, widths)
+    ) + Color.END]
+    for number, persona in enumerate(personas, start=first_number):
+        lines.append(Color.GREEN + str(number).ljust(6) + "  ".join(
+            str(persona.get(key, '')).ljust(width)
+            for key, width in zip(STORED_SEARCH_HEADER, widths)
+        ) + Color.END)
+    return "\n".join(lines)
+
+
+def view_all_stored_search_personas(page_size=STORED_PERSONAS_PAGE_SIZE):
     """
-    Displays details of all stored search personas.
+    Displays the stored search personas a page at a time. Each
+    page is read when it is first shown, with one ranged read,
+    and kept for when the user comes back to it.
     """
-    sheet = GSPREAD_CLIENT.open('ProductSurvey')
-    stored_search_worksheet = sheet.worksheet('Stored last search')
-    all_stored_search_personas = stored_search_worksheet.get_all_records()
+    wait_for_stored_personas()
+    backend = get_backend()
+    count = backend.count_stored_personas()
 
-    print(Color.UNDERLINE + "\nAll Stored Search Personas:\n" + Color.END)
-    if all_stored_search_personas:
-        for persona in all_stored_search_personas:
-            for key, value in persona.items():
-                print(Color.GREEN + f"{key}: {value}" + Color.END)
-            print()
-    else:
+    if not count:
+        print(Color.UNDERLINE + "\nAll Stored Search Personas:\n" +
+              Color.END)
         print(Color.RED + "\nNo available data\n" + Color.END)
-    press_enter_to_stored_data_menu()
+        return press_enter_to_stored_data_menu()
+
+    pages = {}
+    page_count = (count + page_size - 1) // page_size
+    page = 0
+    while True:
+        if page not in pages:
+            pages[page] = backend.read_stored_personas(
+                page * page_size, page_size
+            )
+        first_number = page * page_size + 1
+        last_number = first_number + len(pages[page]) - 1
+        with screen():
+            print(Color.UNDERLINE + "\nAll Stored Search Personas:\n" +
+                  Color.END)
+            print(format_persona_page(pages[page], first_number))
+            print(f"\nShowing {first_number}-{last_number} of {count} "
+                  f"(page {page + 1} of {page_count})\n")
+            print("Enter n for next page, p for previous page "
+                  "or press Enter to return: ")
+        choice = input().strip().lower()
+        if choice == 'n' and page + 1 < page_count:
+            page += 1
+        elif choice == 'p' and page > 0:
+            page -= 1
+        elif choice not in ('n', 'p'):
+            return 'stored'
 
 
 def press_enter_to_main_menu():
@@ -876,7 +3506,7 @@ def press_enter_to_main_menu():
     press Enter to return to the main menu.
     """
     input("Press Enter to return to the main menu...\n")
-    main()
+    return 'main'
 
 
 def try_again_main_menu():
@@ -885,7 +3515,7 @@ def try_again_main_menu():
     press Enter to try again.
     """
     input("Press Enter to try again....\n")
-    main()
+    return 'main'
 
 
 def press_enter_to_extract_data_menu():
@@ -894,7 +3524,7 @@ def press_enter_to_extract_data_menu():
     Enter to return to the extract data menu.
     """
     input("Press Enter to return to the extract data menu...\n")
-    extract_analyzed_data()
+    return 'extract'
 
 
 def try_again_extract_data_menu():
@@ -903,7 +3533,7 @@ def try_again_extract_data_menu():
     press Enter to try again.
     """
     input("Press Enter to try again....\n")
-    extract_analyzed_data()
+    return 'extract'
 
 
 def press_enter_to_stored_data_menu():
@@ -912,38 +3542,188 @@ def press_enter_to_stored_data_menu():
     Enter to return to the stored data menu.
     """
     input("Press Enter to return to the stored data menu...\n")
-    view_stored_data()
+    return 'stored'
 
 
-def clear_screen():
+@contextlib.contextmanager
+def screen():
     """
-    Clears the terminal to give the user a fresh start
+    Collects everything printed in the with block and writes it
+    to the terminal in one go, after clearing it with ANSI escape
+    codes. Over the web terminal each write is sent on to the
+    browser by itself, so one write per screen replaces dozens,
+    and no 'clear' process is started for each screen.
     """
-    os.system('cls' if os.name == 'nt' else 'clear')
+    frame = io.StringIO()
+    with contextlib.redirect_stdout(frame):
+        yield
+    sys.stdout.write(CLEAR_SCREEN + frame.getvalue())
+    sys.stdout.flush()
 
 
-def main():
+def main_menu():
     """
-    Main functions.
+    Shows the welcome message and main menu and returns the
+    screen the user picked.
     """
-    while True:
-        clear_screen()
+    global PREFETCH_THREAD
+    with screen():
         welcome_message()
-        choice = input("Enter your choice: \n")
-
-        if choice == '1':
-            insert_data()
-        elif choice == '2':
-            extract_analyzed_data()
-        elif choice == '3':
-            view_stored_data()
-        elif choice == '4':
-            print("Exiting the program...\n")
-            break
-        else:
-            print(Color.RED + "Invalid choice...\n" + Color.END)
-            try_again_main_menu()
+        print("Enter your choice: ")
+    if PREFETCH_THREAD is None:
+        # Load the data while the user reads the menu
+        PREFETCH_THREAD = prefetch_survey_data()
+    choice = input()
+
+    if choice == '1':
+        return insert_data()
+    elif choice == '2':
+        return 'extract'
+    elif choice == '3':
+        return 'stored'
+    elif choice == '4':
+        print("Exiting the program...\n")
+        close_outbox()
+        save_snapshot()
+        return 'exit'
+    else:
+        print(Color.RED + "Invalid choice...\n" + Color.END)
+        return try_again_main_menu()
+
+
+EXTRACT_MENU_ACTIONS = {
+    '1': search_by_gender,
+    '2': search_by_age_group,
+    '3': search_by_income_bracket,
+    '4': combine_gender_and_age_group,
+    '5': combine_gender_and_income_bracket,
+    '6': combine_age_group_and_income_bracket,
+    '7': create_persona,
+    '8': full_report
+}
+
+MENU_SCREENS = {
+    'main': main_menu,
+    'extract': extract_analyzed_data,
+    'stored': view_stored_data
+}
+PREFETCH_THREAD = None
+
+
+def main(state='main'):
+    """
+    Runs the menus as a state machine. Every screen returns the
+    name of the screen to show next, and the loop shows it, so
+    the stack stays the same depth however long a session runs.
+    """
+    while state != 'exit':
+        if state == 'main' and PROFILER is not None:
+            PROFILER.write_summary()
+        state = MENU_SCREENS[state]()
+
+
+def parse_args(argv=None):
+    """
+    Parses the command line. Without a command the interactive
+    survey is started.
+    """
+    parser = argparse.ArgumentParser(
+        description="Apple Vision Pro Product Survey"
+    )
+    parser.add_argument(
+        '--profile', action='store_true',
+        help="print the time spent in each Sheets request and data step "
+             "when the program exits (or set SURVEY_PROFILE)"
+    )
+    parser.add_argument(
+        '--trace',
+        help="also log every timed step to this JSON lines file "
+             "(or set SURVEY_TRACE)"
+    )
+    parser.add_argument(
+        '--intervals', action='store_true',
+        help="show the number of responses and a bootstrap confidence "
+             "interval next to every likelihood (or set SURVEY_INTERVALS)"
+    )
+    subparsers = parser.add_subparsers(dest='command')
+
+    query_parser = subparsers.add_parser(
+        'query', help="answer segment queries from a JSON lines file"
+    )
+    query_parser.add_argument(
+        '--file', type=argparse.FileType('r'), default='-',
+        help="file with one JSON query per line (default: stdin)"
+    )
+    query_parser.add_argument(
+        '--output', type=argparse.FileType('w'), default='-',
+        help="where to write the JSON results (default: stdout)"
+    )
+
+    report_parser = subparsers.add_parser(
+        'report', help="print every segment and persona in one report"
+    )
+    report_parser.add_argument('--csv', help="also save the report as CSV")
+    report_parser.add_argument('--json', help="also save the report as JSON")
+
+    import_parser = subparsers.add_parser(
+        'import', help="add respondents from a CSV or JSON lines file"
+    )
+    import_parser.add_argument(
+        'file', type=argparse.FileType('r', encoding='utf-8'),
+        help="CSV file with a Gender, Age Group, Income Bracket and "
+             "Likelihood header, or one JSON object per line"
+    )
+    import_parser.add_argument(
+        '--format', choices=['csv', 'jsonl'],
+        help="file format (default: guessed from the file name)"
+    )
+    import_parser.add_argument(
+        '--chunk-size', type=int, default=IMPORT_CHUNK_SIZE,
+        help=f"rows per write request (default: {IMPORT_CHUNK_SIZE})"
+    )
+    import_parser.add_argument(
+        '--start-line', type=int, default=1,
+        help="skip the lines before this one, to resume an import"
+    )
+    import_parser.add_argument(
+        '--rejects', type=argparse.FileType('w'),
+        help="write rejected rows to this file instead of printing them"
+    )
+    return parser.parse_args(argv)
 
 
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    if args.profile or args.trace:
+        enable_profiling(args.trace)
+    if args.intervals:
+        SHOW_INTERVALS = True
+    if SURVEY_DAEMON and not connect_daemon(SURVEY_DAEMON):
+        print(Color.YELLOW + f"Survey daemon not reachable at "
+              f"{SURVEY_DAEMON}, connecting directly.\n" + Color.END)
+    get_outbox()
+    if args.command == 'query':
+        batch_query(args.file, args.output)
+        close_outbox()
+        save_snapshot()
+    elif args.command == 'report':
+        report = build_full_report(SNAPSHOT.get_cube())
+        print_full_report(report)
+        if args.csv:
+            write_report_csv(report, args.csv)
+        if args.json:
+            write_report_json(report, args.json)
+        close_outbox()
+        save_snapshot()
+    elif args.command == 'import':
+        file_format = args.format or (
+            'jsonl' if args.file.name.endswith(('.jsonl', '.json'))
+            else 'csv'
+        )
+        import_respondents(
+            args.file, file_format, args.start_line, args.chunk_size,
+            args.rejects
+        )
+        close_outbox()
+    else:
+        main()
@@ -0,0 +1,349 @@
+"""
+Long-running HTTP/JSON service for the Apple Vision Pro Product Survey.
+
+One process keeps a warm snapshot of the survey data and answers many
+clients from it, instead of one run.py process per viewer. Requests are
+handled by a pool of worker threads that share the snapshot in run.py.
+
+Endpoints:
+  GET  /segment?Gender=Male&Age+Group=25-34   likelihood for one segment
+  POST /segments  [{"Gender": "Male"}, ...]    likelihood for many segments
+  GET  /report                                 every segment and persona
+  GET  /personas?offset=0&limit=10            stored search personas
+  GET  /metrics                                Sheets request scheduler
+  GET  /profile                                timings, with SURVEY_PROFILE
+  POST /responses {"Gender": ..., "Likelihood": 7, ...}   insert a response
+
+Run it against the local SQLite backend to test without Google credentials:
+  SURVEY_BACKEND=sqlite python server.py --port 8000
+
+With --socket the same process also acts as the shared daemon for the
+terminal sessions that controllers/default.js spawns. Each `run.py`
+started with SURVEY_DAEMON set to that socket sends its storage calls
+and queries here instead of opening its own Google Sheets connection:
+  python server.py --socket /tmp/survey.sock --no-http
+  SURVEY_DAEMON=/tmp/survey.sock python run.py
+"""
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qsl, urlsplit
+import argparse
+import json
+import os
+import socketserver
+import sys
+import threading
+
+import run
+
+
+class SurveyRequestHandler(BaseHTTPRequestHandler):
+    """
+    Routes each request to the survey functions in run.py and
+    answers with JSON.
+    """
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == '/segment':
+            query = dict(parse_qsl(url.query))
+            self.answer(lambda: run.answer_query(
+                run.SNAPSHOT.get_cube(), query
+            ))
+        elif url.path == '/report':
+            self.answer(lambda: run.build_full_report(
+                run.SNAPSHOT.get_cube()
+            ))
+        elif url.path == '/personas':
+            query = dict(parse_qsl(url.query))
+            self.answer(lambda: read_stored_personas(
+                int(query.get('offset', 0)),
+                int(query['limit']) if 'limit' in query else None
+            ))
+        elif url.path == '/metrics':
+            self.answer(run.SCHEDULER.metrics)
+        elif url.path == '/profile':
+            if run.PROFILER is None:
+                self.send_json(404, {
+                    'error': "Profiling is off. Set SURVEY_PROFILE to 1."
+                })
+            else:
+                self.answer(run.PROFILER.summary)
+        else:
+            self.send_json(404, {'error': f"Not found: {url.path}"})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path == '/segments':
+            self.answer(lambda: self.answer_segments(self.read_json()))
+        elif url.path == '/responses':
+            self.answer(lambda: self.insert_response(self.read_json()), 201)
+        else:
+            self.send_json(404, {'error': f"Not found: {url.path}"})
+
+    def answer_segments(self, queries):
+        """
+        Answers a list of segment queries from the same cube.
+        """
+        if not isinstance(queries, list):
+            raise ValueError("Expected a JSON list of queries.")
+        cube = run.SNAPSHOT.get_cube()
+        return [run.answer_query(cube, query) for query in queries]
+
+    def insert_response(self, record):
+        """
+        Validates and saves one survey response.
+        """
+        record = run.validate_response(record)
+        run.save_response(record)
+        return record
+
+    def read_json(self):
+        """
+        Returns the parsed JSON body of the request.
+        """
+        length = int(self.headers.get('Content-Length', 0))
+        return json.loads(self.rfile.read(length) or b'null')
+
+    def answer(self, action, status=200):
+        """
+        Runs the action and sends its result, a 400 response if
+        the request was invalid, or a 500 response if the action
+        failed for any other reason.
+        """
+        try:
+            result = action()
+        except ValueError as error:
+            self.send_json(400, {'error': str(error)})
+        except Exception as error:
+            print(f"{self.command} {self.path} failed: {error!r}",
+                  file=sys.stderr)
+            self.send_json(500, {'error': f"{type(error).__name__}: {error}"})
+        else:
+            self.send_json(status, result)
+
+    def send_json(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class SurveyServer(HTTPServer):
+    """
+    An HTTPServer that hands each connection to a fixed pool of
+    worker threads instead of starting a thread per request.
+    """
+
+    def __init__(self, address, workers=8, verbose=False):
+        super().__init__(address, SurveyRequestHandler)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.verbose = verbose
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self.handle_in_worker, request, client_address)
+
+    def handle_in_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+
+
+def append_respondent(row):
+    """
+    Validates and saves a respondent row sent by a terminal session.
+    """
+    record = run.validate_response(dict(zip(run.INPUT_DATA_HEADER, row)))
+    run.save_response(record)
+
+
+def read_respondents(first_row=2):
+    """
+    Returns the header and respondent rows from the given row on.
+    """
+    return run.get_backend().read_respondents(first_row)
+
+
+def source():
+    """
+    Returns the name of the backend the daemon reads and writes.
+    """
+    return run.get_backend().source
+
+
+def read_respondent_page(first_row, page_size):
+    """
+    Returns the header and up to page_size respondent rows from
+    the given row on.
+    """
+    pages = run.get_backend().read_respondent_pages(first_row, page_size)
+    try:
+        return next(pages)
+    finally:
+        pages.close()
+
+
+def segment_histograms():
+    """
+    Returns the histograms of the warm cube, at most 11 rows per cell.
+    """
+    return run.SNAPSHOT.get_cube().histogram_rows()
+
+
+def append_stored_persona(row):
+    """
+    Saves a stored persona row sent by a terminal session.
+    """
+    run.save_stored_persona(row)
+
+
+def append_rows(target, rows, keys):
+    """
+    Saves a batch of rows sent by a terminal session, such as an
+    import. Respondent rows are validated first.
+    """
+    if target == 'respondents':
+        rows = [
+            list(run.validate_response(
+                dict(zip(run.INPUT_DATA_HEADER, row))
+            ).values())
+            for row in rows
+        ]
+        run.save_response_batch(rows, keys)
+    else:
+        run.get_backend().append_rows(target, rows, keys)
+
+
+def read_stored_personas(offset=0, limit=None):
+    """
+    Returns the stored personas, all of them or one page.
+    """
+    return run.get_backend().read_stored_personas(offset, limit)
+
+
+def written_keys(target, keys):
+    """
+    Returns the submission keys that are already stored.
+    """
+    return sorted(run.get_backend().written_keys(target, keys))
+
+
+def count_stored_personas():
+    """
+    Returns the number of stored personas.
+    """
+    return run.get_backend().count_stored_personas()
+
+
+DAEMON_METHODS = {
+    'source': source,
+    'append_respondent': append_respondent,
+    'read_respondents': read_respondents,
+    'read_respondent_page': read_respondent_page,
+    'segment_histograms': segment_histograms,
+    'append_stored_persona': append_stored_persona,
+    'read_stored_personas': read_stored_personas,
+    'count_stored_personas': count_stored_personas,
+    'append_rows': append_rows,
+    'written_keys': written_keys
+}
+
+
+class DaemonRequestHandler(socketserver.StreamRequestHandler):
+    """
+    Serves one terminal session: reads JSON line requests from the
+    connection until it closes and answers each with a JSON line.
+    """
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                name = request.get('method')
+                if name not in DAEMON_METHODS:
+                    raise LookupError(f"Unknown request: {name}")
+                method = DAEMON_METHODS[name]
+                response = {'result': method(*request.get('params', []))}
+            except Exception as error:
+                response = {'error': str(error)}
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+
+
+class SurveyDaemon(socketserver.ThreadingMixIn,
+                   socketserver.UnixStreamServer):
+    """
+    A Unix socket server with one thread per connected session.
+    """
+    daemon_threads = True
+
+
+def start_daemon(path):
+    """
+    Starts the daemon on a Unix socket in a background thread.
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    daemon = SurveyDaemon(path, DaemonRequestHandler)
+    threading.Thread(target=daemon.serve_forever, daemon=True).start()
+    return daemon
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="HTTP/JSON service for the product survey"
+    )
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--verbose', action='store_true',
+                        help="log every request")
+    parser.add_argument('--socket',
+                        help="serve terminal sessions on this Unix socket")
+    parser.add_argument('--no-http', action='store_true',
+                        help="only serve the Unix socket")
+    args = parser.parse_args()
+
+    # Drains the journals of sessions that crashed before saving
+    run.get_outbox()
+    run.SNAPSHOT.get_cube()
+    run.save_snapshot()
+    if args.socket:
+        daemon = start_daemon(args.socket)
+        print(f"Serving terminal sessions on {args.socket}")
+    try:
+        if args.no_http:
+            threading.Event().wait()
+        else:
+            server = SurveyServer(
+                (args.host, args.port), args.workers, args.verbose
+            )
+            print(f"Serving the survey on http://{args.host}:{args.port}/")
+            try:
+                server.serve_forever()
+            finally:
+                server.server_close()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if args.socket:
+            daemon.server_close()
+            os.remove(args.socket)
+        run.close_outbox()
+        run.save_snapshot()
+
+
+if __name__ == "__main__":
+    main()